@@ -1,18 +1,22 @@
-import requests
-from annotated_types import Timezone
+import asyncio
+import os
 from zoneinfo import ZoneInfo
-from bs4 import BeautifulSoup
 import xml.etree.ElementTree as ET
 from datetime import datetime, timezone
 
-from numba.core.ir import Global
-from numba.core.types import none
-from pytz import utc
 from shapely.geometry import Point, Polygon
 
+import http_client
+from alert_index import AlertIndex
+from metrics import ALERT_CRAWL, stage
+from upstream_scheduler import SCHEDULER
+
 
 ALL_ALERTS = None
 
+DATAMART_URL = os.environ.get("DATAMART_URL", "https://dd.weather.gc.ca")
+SCHEDULER.route(DATAMART_URL, "datamart")
+
 PROVINCE_OFFICES = {
     "ON": "CWTO",
     "QC": "CWUL",
@@ -68,8 +72,10 @@ ALERT_NAMES_BUCKET = {
 }
 
 
-def _get_office_dirs(base_url):
-    html = requests.get(base_url).text
+async def _get_office_dirs(base_url):
+    from bs4 import BeautifulSoup
+
+    html = (await http_client.get(base_url)).text
     soup = BeautifulSoup(html, "html.parser")
     return [
         base_url + a["href"]
@@ -78,14 +84,83 @@ def _get_office_dirs(base_url):
     ]
 
 
-def _get_time_dirs(office_dir):
-    html = requests.get(office_dir).text
-    soup = BeautifulSoup(html, "html.parser")
+class _CrawlState:
+    """
+    What we already know about one office's directory for the current day.
+
+    Time directories other than the newest never change again, so their CAP
+    listings are remembered outright. Listings that can still change are
+    re-requested conditionally, and every CAP file is parsed only once.
+    """
+
+    def __init__(self, office_dir):
+        self.office_dir = office_dir
+        self.listings = {}     # url -> (etag, last_modified, hrefs)
+        self.sealed_dirs = {}  # time_dir -> cap urls
+        self.caps = {}         # cap url -> parsed alerts
+
+        self.listings_fetched = 0
+        self.listings_not_modified = 0
+        self.caps_fetched = 0
+        self.caps_reused = 0
+
+
+# office_code -> _CrawlState
+_CRAWL_STATES = {}
+
+
+def _get_crawl_state(office_code, office_dir):
+    state = _CRAWL_STATES.get(office_code)
+
+    # A new day means a new directory tree, so start over
+    if state is None or state.office_dir != office_dir:
+        state = _CrawlState(office_dir)
+        _CRAWL_STATES[office_code] = state
+
+    return state
+
+
+async def _get_listing(url, state):
+    """Hrefs in a directory listing, revalidated with ETag / If-Modified-Since."""
+    cached = state.listings.get(url)
+
+    headers = {}
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    response = await http_client.get(url, headers=headers)
+
+    if response.status_code == 304 and cached:
+        state.listings_not_modified += 1
+        return cached[2]
+
+    from bs4 import BeautifulSoup
+
+    state.listings_fetched += 1
+    soup = BeautifulSoup(response.text, "html.parser")
+    hrefs = [a["href"] for a in soup.find_all("a", href=True)]
+
+    if response.status_code == 200:
+        state.listings[url] = (
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+            hrefs,
+        )
+
+    return hrefs
+
+
+async def _get_time_dirs(office_dir, state):
+    hrefs = await _get_listing(office_dir, state)
 
     time_dirs = [
-        office_dir + a["href"]
-        for a in soup.find_all("a", href=True)
-        if a["href"].endswith("/") and a["href"].strip("/").isdigit()
+        office_dir + href
+        for href in hrefs
+        if href.endswith("/") and href.strip("/").isdigit()
     ]
 
     # Sort newest to oldest based on the numeric folder name
@@ -96,8 +171,29 @@ def _get_time_dirs(office_dir):
     )
 
 
-def _parse_alert_cap(alert_url, seen_types, tz):
-    alert_xml = requests.get(alert_url).content
+async def _get_alert_urls(time_dir, state, sealed):
+    if time_dir in state.sealed_dirs:
+        return state.sealed_dirs[time_dir]
+
+    hrefs = await _get_listing(time_dir, state)
+    alert_urls = [time_dir + href for href in hrefs if href.endswith(".cap")]
+
+    if sealed:
+        state.sealed_dirs[time_dir] = alert_urls
+        state.listings.pop(time_dir, None)
+
+    return alert_urls
+
+
+async def _fetch_alert_cap(alert_url):
+    return (await http_client.get(alert_url)).content
+
+
+def _parse_alert_cap(alert_xml, tz):
+    """
+    Parses every English alert in a CAP file, expired or not. The result only
+    depends on the file, so it can be cached by URL.
+    """
     root = ET.fromstring(alert_xml)
 
     parsed_alerts = []
@@ -110,9 +206,7 @@ def _parse_alert_cap(alert_url, seen_types, tz):
         event_raw = info.find(".//{*}event").text
         event = ALERT_NAMES_BUCKET.get(event_raw, event_raw)
 
-        if event in seen_types:
-            continue
-
+        expires = None
         expires_el = info.find(".//{*}expires")
         if expires_el is not None and expires_el.text:
             try:
@@ -121,9 +215,7 @@ def _parse_alert_cap(alert_url, seen_types, tz):
             except Exception:
                 pass
 
-        if expires < datetime.now(timezone.utc):
-            continue
-
+        onset = None
         onset_el = info.find(".//{*}onset")
 
         if onset_el is not None and onset_el.text:
@@ -190,88 +282,92 @@ def _detect_province_for_coords(lat, lon):
     return None
 
 
-def _get_all_alerts(office_code, province):
+async def _get_all_alerts(office_code, province):
     tz = PROVINCE_TIMEZONES.get(province)
     date = datetime.now(ZoneInfo(tz)).strftime("%Y%m%d")
-    base = f"https://dd.weather.gc.ca/{date}/WXO-DD/alerts/cap/{date}/"
+    base = f"{DATAMART_URL}/{date}/WXO-DD/alerts/cap/{date}/"
     office_dir = base + f"{office_code}/"
     all_alerts = []
 
     if office_dir:
-        print("\n-------------------------------\n" + office_dir)
-        time_dirs = _get_time_dirs(office_dir)
+        state = _get_crawl_state(office_code, office_dir)
+        before = _crawl_counts(state)
+        time_dirs = await _get_time_dirs(office_dir, state)
         seen_types = set()
+        now = datetime.now(timezone.utc)
 
-        for time_dir in time_dirs:
-            print("\n- Time_dir: ", time_dir.split("/")[-2])
-            html = requests.get(time_dir).text
-            soup = BeautifulSoup(html, "html.parser")
+        for i, time_dir in enumerate(time_dirs):
+            # Only the newest directory can still receive files
+            alert_urls = await _get_alert_urls(time_dir, state, sealed=i > 0)
 
-            alert_urls = [
-                time_dir + a["href"]
-                for a in soup.find_all("a", href=True)
-                if a["href"].endswith(".cap")
-            ]
+            new_urls = [url for url in alert_urls if url not in state.caps]
+            state.caps_reused += len(alert_urls) - len(new_urls)
+            state.caps_fetched += len(new_urls)
 
-            for alert_url in alert_urls:
-                parsed = _parse_alert_cap(alert_url, seen_types, tz)
-                for alert in parsed:
-                    if not alert:
-                        continue
+            alert_xmls = await asyncio.gather(*(_fetch_alert_cap(url) for url in new_urls))
+            for url, alert_xml in zip(new_urls, alert_xmls):
+                state.caps[url] = _parse_alert_cap(alert_xml, tz)
 
-                    alert_type = alert["type"]
-                    print("\n" + alert_type)
+            # Newest directory first, listing order within it, so the first alert of each type still wins
+            for alert_url in alert_urls:
+                parsed = [
+                    alert for alert in state.caps[alert_url]
+                    if alert["type"] not in seen_types
+                    and (alert["expires"] is None or alert["expires"] >= now)
+                ]
 
+                for alert in parsed:
                     all_alerts.append(alert)
-                    seen_types.add(alert_type)
+                    seen_types.add(alert["type"])
+
+        for item, count in _crawl_counts(state).items():
+            ALERT_CRAWL.inc(office_code, item, amount=count - before[item])
 
     return all_alerts
 
 
-def get_alerts_for_coords(lat, lon):
+def _crawl_counts(state) -> dict:
+    return {
+        "listings_fetched": state.listings_fetched,
+        "listings_not_modified": state.listings_not_modified,
+        "caps_fetched": state.caps_fetched,
+        "caps_reused": state.caps_reused,
+    }
+
+
+def get_office_for_coords(lat, lon):
     """
-    Returns a list of alert dicts affecting the given coordinates.
-    Each alert includes type, description, urgency, severity, instruction, and areas.
+    Returns the (office_code, province) whose alerts cover the given coordinates,
+    or None if they are outside every province we know about.
     """
-    point = Point(lon, lat)
-    matching_alerts = []
-
     province = _detect_province_for_coords(lat, lon)
     if not province:
-        return []
+        return None
 
     office_code = PROVINCE_OFFICES.get(province)
     if not office_code:
-        return []
+        return None
 
-    alerts = _get_all_alerts(office_code, province)
-    print_alerts(alerts)
+    return office_code, province
 
-    for alert in alerts :
-        for polygon in alert["polygons"]:
-            if polygon.contains(point) or polygon.buffer(0.05).contains(point):
-                matching_alerts.append(alert)
-                break
 
-    return matching_alerts
+async def get_alerts_for_office(office_code, province):
+    with stage("alert_crawl"):
+        return await _get_all_alerts(office_code, province)
 
-def print_alerts(alerts):
-    est = ZoneInfo("America/Toronto")
 
-    for alert in alerts:
-        print("\n" + alert["type"])
+def match_alerts(alerts, lat, lon):
+    return AlertIndex(alerts).match(lat, lon)
 
-        expires = alert.get("expires")
-        onset = alert.get("onset")
-        if expires:
-            expires_est = expires.astimezone(est)
-        else:
-            print("Expires: Unknown")
 
-        if onset:
-            onset_est = onset.astimezone(est)
-        else:
-            print("Onset: Unknown")
+async def get_alerts_for_coords(lat, lon):
+    """
+    Returns a list of alert dicts affecting the given coordinates.
+    Each alert includes type, description, urgency, severity, instruction, and areas.
+    """
+    office = get_office_for_coords(lat, lon)
+    if not office:
+        return []
 
-        print("Event from " + onset_est.strftime("%b %d, %H:%M") + " to " + expires_est.strftime("%b %d, %H:%M"))
-        print("Severity: " + alert["severity"])
\ No newline at end of file
+    alerts = await get_alerts_for_office(*office)
+    return match_alerts(alerts, lat, lon)
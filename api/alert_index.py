@@ -0,0 +1,63 @@
+import numpy as np
+import shapely
+from shapely.strtree import STRtree
+
+# ---------------- CONFIG ----------------
+
+# Alerts also cover points within this many degrees (~5 km) of their polygons
+MATCH_BUFFER = 0.05
+
+# ----------------------------------------
+
+
+class AlertIndex:
+    """
+    STRtree over every alert polygon, buffered and prepared once up front.
+
+    Lookups only test the polygons whose bounding boxes contain the point,
+    so they no longer scale with alert count × polygon complexity.
+    """
+
+    def __init__(self, alerts):
+        self.alerts = list(alerts)
+
+        geometries = []
+        owners = []
+        for i, alert in enumerate(self.alerts):
+            for polygon in alert["polygons"]:
+                geometries.append(polygon.buffer(MATCH_BUFFER))
+                owners.append(i)
+
+        self._geometries = np.array(geometries, dtype=object)
+        self._owners = np.array(owners, dtype=np.intp)
+
+        shapely.prepare(self._geometries)
+        self._tree = STRtree(self._geometries) if geometries else None
+
+    def __len__(self):
+        return len(self.alerts)
+
+    def match(self, lat, lon) -> list:
+        return self.match_many([(lat, lon)])[0]
+
+    def match_many(self, coords) -> list:
+        """
+        Matches a batch of (lat, lon) pairs in one vectorized query.
+        Returns one list of alerts per pair, in the order they were indexed.
+        """
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        matches = [[] for _ in range(len(coords))]
+
+        if self._tree is None or not len(coords):
+            return matches
+
+        points = shapely.points(coords[:, 1], coords[:, 0])
+        point_indices, geometry_indices = self._tree.query(points, predicate="within")
+
+        # An alert with several polygons can match the same point more than once
+        pairs = np.unique(np.stack([point_indices, self._owners[geometry_indices]], axis=1), axis=0)
+
+        for point_index, alert_index in pairs:
+            matches[point_index].append(self.alerts[alert_index])
+
+        return matches
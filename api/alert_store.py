@@ -0,0 +1,142 @@
+import asyncio
+from datetime import datetime, timezone
+
+from alert_fetcher import PROVINCE_OFFICES, get_alerts_for_office
+from alert_index import AlertIndex
+from single_flight import SingleFlight
+from upstream_scheduler import BACKGROUND, priority
+
+# ---------------- CONFIG ----------------
+
+REFRESH_SECONDS = 5 * 60
+CRAWL_TIMEOUT = 90
+
+# ----------------------------------------
+
+
+class AlertStore:
+    """
+    Latest parsed alerts for every office, refreshed by the background poller.
+    Each office keeps a spatial index that is rebuilt only when its alerts
+    change, so reads never touch the network or re-buffer a polygon.
+    """
+
+    def __init__(self):
+        self._indexes = {}       # office_code -> AlertIndex
+        self._refreshed_at = {}  # office_code -> datetime of the last successful crawl
+        self.rebuilds = 0
+
+    def replace(self, office_code, alerts):
+        alerts = list(alerts)
+        index = self._indexes.get(office_code)
+
+        # The crawler hands back the very same parsed alerts for CAP files it
+        # has already seen, so an unchanged office is the same list of objects
+        if index is None or not _same_alerts(index.alerts, alerts):
+            self._indexes[office_code] = AlertIndex(alerts)
+            self.rebuilds += 1
+
+        self._refreshed_at[office_code] = datetime.now(timezone.utc)
+
+    def has_office(self, office_code) -> bool:
+        return office_code in self._indexes
+
+    def alerts_for_office(self, office_code) -> list:
+        now = datetime.now(timezone.utc)
+        index = self._indexes.get(office_code)
+        return [alert for alert in index.alerts if not _is_expired(alert, now)] if index else []
+
+    def match(self, office_code, lat, lon) -> list:
+        return self.match_many(office_code, [(lat, lon)])[0]
+
+    def match_many(self, office_code, coords) -> list:
+        """Alerts covering each (lat, lon) pair, skipping any that expired since the last eviction."""
+        index = self._indexes.get(office_code)
+        if index is None:
+            return [[] for _ in coords]
+
+        now = datetime.now(timezone.utc)
+        return [
+            [alert for alert in matches if not _is_expired(alert, now)]
+            for matches in index.match_many(coords)
+        ]
+
+    def evict_expired(self) -> int:
+        now = datetime.now(timezone.utc)
+        evicted = 0
+
+        for office_code, index in list(self._indexes.items()):
+            live = [alert for alert in index.alerts if not _is_expired(alert, now)]
+            if len(live) != len(index):
+                evicted += len(index) - len(live)
+                self._indexes[office_code] = AlertIndex(live)
+                self.rebuilds += 1
+
+        return evicted
+
+    def stats(self) -> dict:
+        return {
+            office_code: {
+                "alerts": len(index),
+                "refreshed_at": self._refreshed_at[office_code].isoformat(),
+            }
+            for office_code, index in self._indexes.items()
+        }
+
+
+def _same_alerts(old, new) -> bool:
+    return len(old) == len(new) and all(a is b for a, b in zip(old, new))
+
+
+def _is_expired(alert, now) -> bool:
+    expires = alert.get("expires")
+    return expires is not None and expires <= now
+
+
+ALERT_STORE = AlertStore()
+
+# A cold-start /alert request and the poller share one crawl per office
+CRAWLS = SingleFlight(timeout=CRAWL_TIMEOUT)
+
+
+def _offices():
+    """One (office_code, province) pair per office; several provinces share an office."""
+    offices = {}
+    for province, office_code in PROVINCE_OFFICES.items():
+        offices.setdefault(office_code, province)
+    return list(offices.items())
+
+
+async def refresh_office(office_code, province, timeout: float = None):
+    # The index is rebuilt inside the shared crawl, so it happens once per
+    # crawl however many requests are waiting on it, and still lands if they
+    # all time out
+    async def crawl():
+        alerts = await get_alerts_for_office(office_code, province)
+        ALERT_STORE.replace(office_code, alerts)
+        return alerts
+
+    return await CRAWLS.do(office_code, crawl, timeout=timeout)
+
+
+async def refresh_all():
+    offices = _offices()
+    results = await asyncio.gather(
+        *(refresh_office(office_code, province) for office_code, province in offices),
+        return_exceptions=True,
+    )
+
+    # A failed crawl keeps serving that office's previous alerts
+    for (office_code, _), result in zip(offices, results):
+        if isinstance(result, BaseException):
+            print("Alert refresh failed:", office_code, repr(result))
+
+    ALERT_STORE.evict_expired()
+
+
+async def run_poller(interval: float = REFRESH_SECONDS):
+    # Crawls queue behind user requests for Datamart's budget
+    with priority(BACKGROUND):
+        while True:
+            await refresh_all()
+            await asyncio.sleep(interval)
@@ -0,0 +1,246 @@
+"""
+Builds a training dataset for many locations × seasons without babysitting.
+
+    python backfill.py backfill_manifest.json [--workers 8] [--rate 30]
+
+Every (location, season) pair is one chunk. Chunks are fetched by a bounded
+pool of workers under a shared rate limit, and each one is appended to the
+output CSV as soon as it arrives. A checkpoint file next to the output
+records every finished chunk, so re-running the same command after an
+interruption picks up where it left off.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+
+import weather_fetcher as weather
+from label_store import LABELS_DIR
+from upstream_scheduler import BULK, priority
+
+# ---------------- CONFIG ----------------
+
+WORKERS = 8
+
+# Archive requests started per minute. A whole season counts as several calls
+# against Open-Meteo's per-minute allowance, so this stays well under it
+REQUESTS_PER_MINUTE = 30
+
+# Attempts per chunk before it's left for the next run
+CHUNK_ATTEMPTS = 3
+CHUNK_BACKOFF = 5  # seconds, doubled after every attempt
+
+SEASON_START = "11-15"
+SEASON_END = "03-31"
+
+# ----------------------------------------
+
+
+class RateLimiter:
+    """Spaces out acquisitions so no more than `per_minute` start in any minute."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60 / per_minute
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class Checkpoint:
+    """
+    Append-only log of finished chunks, each with the output size right after
+    its rows were written. On resume the output is cut back to the last
+    recorded size, which drops rows from a chunk that was being written when
+    the run stopped.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.done = set()
+        self.output_size = 0
+
+        if path.exists():
+            for line in path.read_text().splitlines():
+                chunk_id, size = line.rsplit(" ", 1)
+                self.done.add(chunk_id)
+                self.output_size = int(size)
+
+        self._file = open(path, "a")
+
+    def record(self, chunk_id, output_size):
+        self._file.write(f"{chunk_id} {output_size}\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.done.add(chunk_id)
+
+    def close(self):
+        self._file.close()
+
+
+def load_manifest(path) -> dict:
+    """
+    {
+      "output": "data/training_dataset_canada.csv",
+      "seasons": [2021, 2022],                 # winters starting in these years
+      "season_start": "11-15", "season_end": "03-31",   # optional
+      "locations": [{"name": "Toronto", "lat": 43.65, "lon": -79.38, "board": "tdsb"}, ...]
+    }
+
+    Every location names the board whose closures label its snow days, a
+    board in the label store ("default" is the original single-board history).
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+
+    # Falling back to one board would label every city with its closures
+    missing = [location["name"] for location in manifest["locations"] if not location.get("board")]
+    if missing:
+        raise ValueError(f"locations without a board: {', '.join(missing)}")
+
+    manifest.setdefault("season_start", SEASON_START)
+    manifest.setdefault("season_end", SEASON_END)
+    return manifest
+
+
+def unlabelled(manifest) -> list:
+    """Locations whose board has no closure history in the label store."""
+    boards = set(weather.LABELS.boards())
+    return [location for location in manifest["locations"] if location["board"] not in boards]
+
+
+def chunks(manifest, skip=()) -> list:
+    """(chunk_id, location, start_date, end_date) for every location × season."""
+    return [
+        (
+            f"{location['name']}/{year}",
+            location,
+            f"{year}-{manifest['season_start']}",
+            f"{int(year) + 1}-{manifest['season_end']}",
+        )
+        for year in manifest["seasons"]
+        for location in manifest["locations"]
+        if location not in skip
+    ]
+
+
+async def fetch_chunk(location, start_date, end_date, limiter: RateLimiter):
+    delay = CHUNK_BACKOFF
+
+    for attempt in range(CHUNK_ATTEMPTS):
+        # Seasons already in the local archive don't touch the network
+        if not weather.archive_has(start_date, end_date, location["lat"], location["lon"]):
+            await limiter.acquire()
+
+        try:
+            return await weather.get_data_within_timerange(
+                start_date, end_date, location["lat"], location["lon"],
+                board=location["board"],
+            )
+        except Exception:
+            # An error body from upstream has no hourly data, so it lands here too
+            if attempt == CHUNK_ATTEMPTS - 1:
+                raise
+            await asyncio.sleep(delay)
+            delay *= 2
+
+
+async def backfill(manifest, workers: int = WORKERS, requests_per_minute: float = REQUESTS_PER_MINUTE):
+    output_path = Path(manifest["output"])
+    checkpoint_path = output_path.with_name(output_path.name + ".checkpoint")
+
+    # Resuming cuts the output back, so never do that to a file we didn't start
+    if output_path.exists() and output_path.stat().st_size and not checkpoint_path.exists():
+        raise RuntimeError(f"{output_path} exists but has no checkpoint; pick another output")
+
+    checkpoint = Checkpoint(checkpoint_path)
+
+    # Drop anything written after the last finished chunk
+    with open(output_path, "a+b") as f:
+        f.truncate(checkpoint.output_size)
+
+    # Every row would be labelled "open", so leave them out until their labels exist
+    skipped = unlabelled(manifest)
+    for location in skipped:
+        print(f"SKIPPED {location['name']}: no closures for board {location['board']!r} in {LABELS_DIR}")
+
+    todo = [chunk for chunk in chunks(manifest, skipped) if chunk[0] not in checkpoint.done]
+    print(f"{len(checkpoint.done)} chunks already done, {len(todo)} to go")
+
+    queue = asyncio.Queue()
+    for chunk in todo:
+        queue.put_nowait(chunk)
+
+    limiter = RateLimiter(requests_per_minute)
+    output = open(output_path, "a", newline="")
+    started = time.time()
+    failed = []
+    finished = 0
+    rows = 0
+
+    async def worker():
+        nonlocal finished, rows
+
+        while True:
+            try:
+                chunk_id, location, start_date, end_date = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            try:
+                df = await fetch_chunk(location, start_date, end_date, limiter)
+            except Exception as e:
+                print(f"FAILED {chunk_id}: {e!r}")
+                failed.append(chunk_id)
+                continue
+
+            # Where each row came from, in front of the features (see feature_schema.ID_COLUMNS)
+            df.insert(0, "location", location["name"])
+            df.insert(1, "board", location["board"])
+            df.insert(2, "lat", location["lat"])
+            df.insert(3, "lon", location["lon"])
+
+            # Stream the chunk straight to disk; nothing else is held in memory.
+            # No await between writing and checkpointing, so chunks never interleave
+            df.to_csv(output, header=output.tell() == 0, index=False)
+            output.flush()
+            os.fsync(output.fileno())
+            checkpoint.record(chunk_id, output.tell())
+
+            finished += 1
+            rows += len(df)
+            print(f"[{finished}/{len(todo)}] {chunk_id}: {len(df)} rows ({time.time() - started:.0f}s)")
+
+    try:
+        # Behind everything else, and never into the share kept for users
+        with priority(BULK):
+            await asyncio.gather(*(worker() for _ in range(workers)))
+    finally:
+        output.close()
+        checkpoint.close()
+
+    print(f"\nDone. Wrote {rows} rows to {output_path} in {time.time() - started:.0f}s")
+    if failed:
+        print(f"{len(failed)} chunks failed; run again to retry them: {', '.join(failed)}")
+
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("manifest")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_MINUTE, help="archive requests per minute")
+    args = parser.parse_args()
+
+    failed = asyncio.run(backfill(load_manifest(args.manifest), args.workers, args.rate))
+    raise SystemExit(1 if failed else 0)
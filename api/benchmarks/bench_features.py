@@ -0,0 +1,54 @@
+"""
+Parity check and benchmark for the vectorized feature builder.
+
+    cd api && python -m benchmarks.bench_features
+"""
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import weather_fetcher
+from feature_engine import build_features
+from label_store import DEFAULT_BOARD
+from benchmarks.fixtures import WEEK, SEASONS, open_meteo_response
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(label, start_date, end_date, repeat):
+    data = open_meteo_response(start_date, end_date)
+    hourly, daily = data["hourly"], data["daily"]
+    start_dt, end_dt = datetime.fromisoformat(start_date), datetime.fromisoformat(end_date)
+    snow_days = weather_fetcher.LABELS.closures(DEFAULT_BOARD)
+
+    by_day_time, by_day = best_of(
+        lambda: weather_fetcher.build_rows_by_day(hourly, daily, start_dt, end_dt),
+        repeat,
+    )
+    vectorized_time, vectorized = best_of(
+        lambda: build_features(hourly, daily, start_dt, end_dt, snow_days),
+        repeat,
+    )
+
+    # Same columns, same order, same values, same dtypes
+    pd.testing.assert_frame_equal(by_day, vectorized)
+
+    print(
+        f"{label:<8} {len(vectorized):>5} rows   "
+        f"per-day {by_day_time * 1000:>10.2f} ms   "
+        f"vectorized {vectorized_time * 1000:>8.2f} ms   "
+        f"{by_day_time / vectorized_time:>7.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    run("week", *WEEK, repeat=20)
+    run("seasons", *SEASONS, repeat=1)
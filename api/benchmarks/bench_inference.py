@@ -0,0 +1,63 @@
+"""
+Agreement check and latency benchmark for the flat-array forest against
+sklearn's predict_proba.
+
+    cd api && python -m benchmarks.bench_inference
+"""
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from forest_engine import FlatForest, export_forest
+from model_registry import ModelRegistry
+
+API_DIR = Path(__file__).resolve().parent.parent
+
+TOLERANCE = 1e-6
+BATCH_SIZES = [1, 5, 500]
+
+
+def feature_rows(model, n, seed=0):
+    """Training rows, jittered so they land in different leaves, with a few NaNs."""
+    data = pd.read_csv(API_DIR / "data" / "training_dataset_6.csv")
+    X = data[list(model.feature_names_in_)].astype(float)
+
+    rnd = np.random.default_rng(seed)
+    X = X.sample(n, replace=True, random_state=seed).reset_index(drop=True)
+    X = X * rnd.uniform(0.5, 1.5, X.shape)
+    X = X.mask(rnd.random(X.shape) < 0.01)
+    return X
+
+
+def mean_latency(fn, repeat):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+if __name__ == "__main__":
+    model = ModelRegistry().load().sklearn_model()
+
+    forest = FlatForest(export_forest(model))
+    print(f"{forest.n_estimators} trees, {len(forest.value)} nodes, {forest.nbytes / 1024:.0f} KB of node arrays\n")
+
+    X = feature_rows(model, max(BATCH_SIZES))
+
+    difference = np.abs(model.predict_proba(X) - forest.predict_proba(X)).max()
+    print(f"max |sklearn - flat| = {difference:.2e}")
+    assert difference < TOLERANCE, "flat forest disagrees with sklearn"
+
+    print()
+    for n in BATCH_SIZES:
+        rows = X.iloc[:n]
+        sklearn_time = mean_latency(lambda: model.predict_proba(rows), repeat=20)
+        flat_time = mean_latency(lambda: forest.predict_proba(rows), repeat=20)
+
+        print(
+            f"{n:>4} rows   sklearn {sklearn_time * 1000:>8.2f} ms   "
+            f"flat {flat_time * 1000:>8.2f} ms   {sklearn_time / flat_time:>6.1f}x"
+        )
@@ -0,0 +1,121 @@
+"""
+Cold-start benchmark for the API process: import time per module, then time
+from launching uvicorn to the first successful response. Exits non-zero if
+time to first response is over budget.
+
+    cd api && python -m benchmarks.bench_startup [--budget 3.0] [--runs 3]
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+API_DIR = Path(__file__).resolve().parent.parent
+
+# Seconds from process launch to first response; override with --budget
+COLD_START_BUDGET = float(os.environ.get("COLD_START_BUDGET", 3.0))
+
+PROBE_PATH = "/docs"
+PROBE_TIMEOUT = 30
+
+# Keep background work from competing with the cold start being measured
+SERVER_ENV = {"PREDICTION_GRID": "0"}
+
+TOP_MODULES = 15
+
+
+def import_times():
+    """
+    (module, self seconds, cumulative seconds) for every module `main` imports
+    directly, from python -X importtime.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=API_DIR,
+        env={**os.environ, **SERVER_ENV},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # Nested imports are indented under the module that triggered them and
+    # are printed before it, so main's direct imports come just before main
+    children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+
+        if depth == 0:
+            if name == "main":
+                return children + [(name, int(self_us) / 1e6, int(cumulative_us) / 1e6)]
+            children = []
+        elif depth == 1:
+            children.append((name, int(self_us) / 1e6, int(cumulative_us) / 1e6))
+
+    raise RuntimeError("main was not imported")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_response(path=PROBE_PATH):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}{path}"
+
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=API_DIR,
+        env={**os.environ, **SERVER_ENV},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    try:
+        while time.perf_counter() - started < PROBE_TIMEOUT:
+            if server.poll() is not None:
+                raise RuntimeError(f"server exited with code {server.returncode}")
+            try:
+                if httpx.get(url, timeout=1).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            time.sleep(0.01)
+
+        raise RuntimeError(f"no response from {path} within {PROBE_TIMEOUT}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget", type=float, default=COLD_START_BUDGET, help="seconds to first response")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    *times, (_, main_self, main_total) = import_times()
+
+    print(f"import main: {main_total * 1000:.0f} ms ({main_self * 1000:.0f} ms in main itself)\n")
+    for name, self_time, cumulative in sorted(times, key=lambda t: t[2], reverse=True)[:TOP_MODULES]:
+        print(f"  {name:<32} {cumulative * 1000:>8.1f} ms   (self {self_time * 1000:.1f} ms)")
+
+    # The first run also warms the OS file cache; report the worst anyway
+    runs = [time_to_first_response() for _ in range(args.runs)]
+
+    print(f"\ntime to first response: {min(runs):.2f}s best, {max(runs):.2f}s worst (budget {args.budget:.2f}s)")
+
+    if max(runs) > args.budget:
+        sys.exit(f"cold start over budget: {max(runs):.2f}s > {args.budget:.2f}s")
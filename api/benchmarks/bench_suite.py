@@ -0,0 +1,281 @@
+"""
+Micro-benchmarks for what every request touches, on fixed fixtures so
+timings compare between commits. Writes the results as JSON and, if there's a
+baseline, compares against it and exits non-zero on any regression.
+
+    cd api && python -m benchmarks.bench_suite                    # run, compare to baseline.json
+    cd api && python -m benchmarks.bench_suite --save-baseline    # run, make this the baseline
+    cd api && python -m benchmarks.bench_suite --filter predict   # only names containing "predict"
+
+baseline.json is committed along with the Python version and machine it was
+taken on. Timings are machine-specific: on anything else, save a baseline
+from that machine before comparing against it.
+"""
+import argparse
+import asyncio
+import atexit
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# main writes the visit counter on import; keep it out of the real one
+_WORKDIR = tempfile.mkdtemp(prefix="bench_suite_")
+atexit.register(shutil.rmtree, _WORKDIR, ignore_errors=True)
+os.environ.setdefault("COUNTER_PATH", str(Path(_WORKDIR) / "counter.csv"))
+os.environ.setdefault("COUNTER_SHARED_PATH", str(Path(_WORKDIR) / "counter.shm"))
+
+import weather_fetcher
+from alert_fetcher import _parse_alert_cap
+from benchmarks.fixtures import WEEK, cap_alert, open_meteo_response
+from explainer import GetExplanations
+from feature_schema import feature_frame, feature_matrix
+from model_registry import ModelRegistry
+from weather_archive import WeatherArchive, month_end, months
+
+API_DIR = Path(__file__).resolve().parent.parent
+BENCH_DIR = Path(__file__).resolve().parent
+
+# ---------------- CONFIG ----------------
+
+RESULTS_PATH = BENCH_DIR / "results.json"
+BASELINE_PATH = BENCH_DIR / "baseline.json"
+
+# A benchmark this much slower than in the baseline is a regression. Runs are
+# compared on their fastest sample: noise from the rest of the machine only
+# ever adds time, so the minimum is the most repeatable number. Busy or
+# single-CPU machines swing by 20-30% between identical runs
+THRESHOLD = 0.25
+
+# Samples per benchmark; each sample loops until it has run at least MIN_SAMPLE_SECONDS
+REPEAT = 10
+MIN_SAMPLE_SECONDS = 0.1
+
+# One school-year season, as backfill.py fetches them
+SEASON = ("2023-11-15", "2024-03-31")
+
+BATCH_SIZES = [1, 5, 500]
+
+# ----------------------------------------
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Registers a setup function that returns the zero-argument callable to time."""
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def time_it(fn, repeat=REPEAT) -> dict:
+    fn()  # warm up
+
+    # Like timeit: a collection landing in one sample but not another is just noise
+    gc.collect()
+    gc.disable()
+    try:
+        return _samples(fn, repeat)
+    finally:
+        gc.enable()
+
+def _samples(fn, repeat) -> dict:
+    # Enough loops per sample that timer resolution doesn't matter
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - start >= MIN_SAMPLE_SECONDS:
+            break
+        loops *= 2
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - start) / loops * 1000)
+
+    return {
+        "median_ms": statistics.median(samples),
+        "min_ms": min(samples),
+        "stdev_ms": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+# ---------------- Fixtures ----------------
+
+_LOOP = asyncio.new_event_loop()
+
+def _archived(start_date, end_date, archive_dir):
+    """
+    Points weather_fetcher at an archive holding fixture data for the whole
+    window, so get_data_within_timerange runs its real path with no network.
+    """
+    archive = WeatherArchive(archive_dir, today=date(2026, 1, 1))
+    spanned = months(date.fromisoformat(start_date), date.fromisoformat(end_date))
+    archive.write(0, 0, open_meteo_response(spanned[0].isoformat(), month_end(spanned[-1]).isoformat()))
+
+    def call():
+        weather_fetcher.WEATHER_ARCHIVE = archive
+        return _LOOP.run_until_complete(weather_fetcher.get_data_within_timerange(start_date, end_date, 0, 0))
+
+    return call
+
+_MODEL = None
+
+def _model():
+    global _MODEL
+    if _MODEL is None:
+        _MODEL = ModelRegistry().load()
+    return _MODEL
+
+def _feature_rows(n, seed=0):
+    """Training rows, jittered so they land in different leaves."""
+    data = pd.read_csv(API_DIR / "data" / "training_dataset_6.csv")
+    data = data.sample(n, replace=True, random_state=seed).reset_index(drop=True)
+    X = feature_matrix(data)
+    return X * np.random.default_rng(seed).uniform(0.5, 1.5, X.shape).astype(np.float32)
+
+
+# ---------------- Benchmarks ----------------
+
+@benchmark("hourly_for_date")
+def _():
+    hourly = open_meteo_response(*WEEK)["hourly"]
+    return lambda: weather_fetcher.get_hourly_for_date(hourly, "2025-01-09")
+
+@benchmark("daily_for_date")
+def _():
+    daily = open_meteo_response(*WEEK)["daily"]
+    return lambda: weather_fetcher.get_daily_for_date(daily, "2025-01-09")
+
+@benchmark("timerange_week")
+def _():
+    return _archived(*WEEK, Path(_WORKDIR) / "archive_week")
+
+@benchmark("timerange_season")
+def _():
+    return _archived(*SEASON, Path(_WORKDIR) / "archive_season")
+
+for _n in BATCH_SIZES:
+    @benchmark(f"predict_proba_{_n}")
+    def _(n=_n):
+        predictor = _model().predictor
+        X = _feature_rows(n)
+        return lambda: predictor.predict_proba(X)
+
+@benchmark("explanations")
+def _():
+    model = _model().sklearn_model()
+    data = feature_frame(pd.read_csv(API_DIR / "data" / "training_dataset_6.csv").iloc[:1])
+    return lambda: GetExplanations(data, model)
+
+@benchmark("describe_day")
+def _():
+    from main import describe_day
+    day = date.today().isoformat()
+    return lambda: describe_day(day)
+
+@benchmark("parse_cap")
+def _():
+    xml = cap_alert("snowfall", (44.0, -81.5, 45.0, -80.5))
+    return lambda: _parse_alert_cap(xml, "America/Toronto")
+
+
+# ---------------- Results ----------------
+
+def run(names) -> dict:
+    results = {}
+    for name in names:
+        results[name] = time_it(BENCHMARKS[name]())
+        print(f"  {name:<20} {results[name]['min_ms']:>10.3f} ms  (median {results[name]['median_ms']:.3f})")
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=API_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold=THRESHOLD) -> list:
+    """Prints each benchmark against the baseline. Returns the names that regressed."""
+    regressions = []
+
+    print(f"\nagainst baseline from {baseline.get('commit') or 'unknown commit'} ({baseline['created']}),")
+    print(f"taken on {baseline.get('platform', baseline['machine'])}, {baseline.get('cpus', '?')} CPUs, Python {baseline['python']}:\n")
+    for name, result in results.items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            print(f"  {name:<20} (new)")
+            continue
+
+        ratio = result["min_ms"] / base["min_ms"]
+        if ratio > 1 + threshold:
+            verdict = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            verdict = "faster"
+        else:
+            verdict = ""
+
+        print(f"  {name:<20} {base['min_ms']:>10.3f} → {result['min_ms']:>10.3f} ms  {ratio:>6.2f}x  {verdict}")
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filter", default="", help="only benchmarks whose name contains this")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results as the baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed slowdown, e.g. 0.25 for 25%%")
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    if not names:
+        sys.exit(f"no benchmark matches {args.filter!r}")
+
+    print("fastest sample per call:\n")
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "benchmarks": run(names),
+    }
+
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(f"\nwrote {args.output}")
+
+    if args.save_baseline:
+        Path(args.baseline).write_text(json.dumps(report, indent=2))
+        print(f"saved as the baseline in {args.baseline}")
+    elif Path(args.baseline).exists():
+        regressions = compare(report["benchmarks"], json.loads(Path(args.baseline).read_text()), args.threshold)
+        if regressions:
+            sys.exit(f"\n{len(regressions)} regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+    else:
+        sys.exit(f"\nno baseline at {args.baseline}; run with --save-baseline to make one")
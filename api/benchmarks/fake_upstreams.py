@@ -0,0 +1,243 @@
+"""
+Local stand-ins for Open-Meteo and Datamart, so the API can be load tested
+without touching the real upstreams.
+
+    cd api && python -m benchmarks.fake_upstreams [--open-meteo-port 8501] [--datamart-port 8502]
+    cd api && python -m benchmarks.fake_upstreams --record   # needs the network
+
+Responses are replayed from benchmarks/recordings/ when something was
+recorded there, and generated from benchmarks/fixtures.py otherwise. Open-Meteo
+recordings are re-dated to whatever window is asked for. Point the API at them
+with OPEN_METEO_FORECAST_URL, OPEN_METEO_ARCHIVE_URL and DATAMART_URL.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import zlib
+from datetime import date, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+
+from benchmarks.fixtures import datamart_tree, open_meteo_response, redate_response
+
+# ---------------- CONFIG ----------------
+
+RECORDINGS_DIR = Path(__file__).resolve().parent / "recordings"
+
+OPEN_METEO_PORT = 8501
+DATAMART_PORT = 8502
+
+# Injected per-request latency in ms, each ± JITTER_MS
+OPEN_METEO_LATENCY_MS = 80
+DATAMART_LATENCY_MS = 40
+JITTER_MS = 20
+
+# Where --record takes its samples from
+RECORD_LOCATION = (44.569, -80.98)
+RECORD_ARCHIVE_WEEK = ("2025-01-06", "2025-01-12")
+
+# ----------------------------------------
+
+
+class Latency:
+    def __init__(self, ms: float, jitter_ms: float = JITTER_MS):
+        self.ms = ms
+        self.jitter_ms = jitter_ms
+
+    async def wait(self):
+        delay = self.ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+
+# ---------------- Open-Meteo ----------------
+
+def _recording(kind):
+    path = RECORDINGS_DIR / "open-meteo" / f"{kind}.json"
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+@lru_cache(maxsize=4096)
+def _open_meteo_body(kind, lats, lons, start_date, end_date) -> bytes:
+    recorded = _recording(kind)
+
+    responses = []
+    for lat, lon in zip(lats.split(","), lons.split(",")):
+        if recorded is not None:
+            data = redate_response(recorded, start_date, end_date)
+        else:
+            # Same location, same weather, however often it's asked for
+            data = open_meteo_response(start_date, end_date, seed=zlib.crc32(f"{lat},{lon}".encode()))
+        responses.append({**data, "latitude": float(lat), "longitude": float(lon)})
+
+    return json.dumps(responses if len(responses) > 1 else responses[0]).encode()
+
+
+def open_meteo_app(latency: Latency) -> Starlette:
+    def endpoint(kind):
+        async def handle(request):
+            await latency.wait()
+            q = request.query_params
+            body = _open_meteo_body(kind, q["latitude"], q["longitude"], q["start_date"], q["end_date"])
+            return Response(body, media_type="application/json")
+        return handle
+
+    return Starlette(routes=[
+        Route("/v1/forecast", endpoint("forecast")),
+        Route("/v1/archive", endpoint("archive")),
+    ])
+
+
+# ---------------- Datamart ----------------
+
+def load_datamart_tree() -> dict:
+    """{"OFFICE/HHMM/file.cap": bytes} from the recordings, or generated per office."""
+    root = RECORDINGS_DIR / "datamart"
+    if root.is_dir():
+        return {
+            path.relative_to(root).as_posix(): path.read_bytes()
+            for path in root.rglob("*.cap")
+        }
+
+    from alert_fetcher import PROVINCE_OFFICES, PROVINCE_POLYGONS
+
+    offices = {}
+    for province, office in PROVINCE_OFFICES.items():
+        offices.setdefault(office, PROVINCE_POLYGONS[province].bounds)
+
+    # Polygon bounds are (min_lon, min_lat, max_lon, max_lat)
+    return datamart_tree({
+        office: (min_lat, min_lon, max_lat, max_lon)
+        for office, (min_lon, min_lat, max_lon, max_lat) in offices.items()
+    })
+
+
+def _listings(tree: dict) -> dict:
+    """Directory path ("" for the root) -> sorted child names, dirs ending in /."""
+    listings = {}
+    for path in tree:
+        parts = path.split("/")
+        for depth in range(len(parts)):
+            parent = "".join(part + "/" for part in parts[:depth])
+            child = parts[depth] + ("/" if depth < len(parts) - 1 else "")
+            listings.setdefault(parent, set()).add(child)
+    return {parent: sorted(children) for parent, children in listings.items()}
+
+
+def datamart_app(latency: Latency, tree: dict) -> Starlette:
+    listings = _listings(tree)
+    pages = {
+        parent: "<html><body>" + "".join(f'<a href="{name}">{name}</a>\n' for name in names) + "</body></html>"
+        for parent, names in listings.items()
+    }
+
+    async def handle(request):
+        await latency.wait()
+
+        # /{date}/WXO-DD/alerts/cap/{date}/OFFICE/HHMM/file.cap; the date doesn't matter
+        path = request.url.path
+        marker = "/alerts/cap/"
+        if marker not in path:
+            return Response(status_code=404)
+        rest = path.split(marker, 1)[1].split("/", 1)
+        rest = rest[1] if len(rest) > 1 else ""
+
+        if rest in tree:
+            return Response(tree[rest], media_type="application/xml")
+
+        page = pages.get(rest)
+        if page is None:
+            return Response(status_code=404)
+
+        # The crawler revalidates listings, so support that like the real server
+        etag = '"' + hashlib.sha1(page.encode()).hexdigest()[:16] + '"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(page, media_type="text/html", headers={"ETag": etag})
+
+    return Starlette(routes=[Route("/{path:path}", handle)])
+
+
+# ---------------- Running ----------------
+
+async def serve(open_meteo_port=OPEN_METEO_PORT, datamart_port=DATAMART_PORT,
+                open_meteo_latency=OPEN_METEO_LATENCY_MS, datamart_latency=DATAMART_LATENCY_MS, jitter=JITTER_MS):
+    servers = [
+        uvicorn.Server(uvicorn.Config(
+            open_meteo_app(Latency(open_meteo_latency, jitter)),
+            host="127.0.0.1", port=open_meteo_port, log_level="warning",
+        )),
+        uvicorn.Server(uvicorn.Config(
+            datamart_app(Latency(datamart_latency, jitter), load_datamart_tree()),
+            host="127.0.0.1", port=datamart_port, log_level="warning",
+        )),
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def _hrefs(html) -> list:
+    # Relative links only, skipping sort links and the parent directory
+    return re.findall(r'href="([^"?/][^"]*)"', html)
+
+
+def record():
+    """Saves real upstream responses into RECORDINGS_DIR for later replay."""
+    import httpx
+
+    import weather_fetcher
+    from alert_fetcher import PROVINCE_OFFICES
+
+    lat, lon = RECORD_LOCATION
+    monday = date.today() - timedelta(days=date.today().weekday())
+    windows = {
+        "forecast": (monday.isoformat(), (monday + timedelta(days=6)).isoformat(), True),
+        "archive": (*RECORD_ARCHIVE_WEEK, False),
+    }
+
+    (RECORDINGS_DIR / "open-meteo").mkdir(parents=True, exist_ok=True)
+    for kind, (start_date, end_date, use_forecast) in windows.items():
+        data = asyncio.run(weather_fetcher.fetch_weather(start_date, end_date, lat, lon, use_forecast=use_forecast))
+        (RECORDINGS_DIR / "open-meteo" / f"{kind}.json").write_text(json.dumps(data))
+        print(f"open-meteo/{kind}.json: {start_date} → {end_date}")
+
+    today = date.today().strftime("%Y%m%d")
+    base = f"https://dd.weather.gc.ca/{today}/WXO-DD/alerts/cap/{today}/"
+
+    with httpx.Client(timeout=30, follow_redirects=True) as client:
+        for office in sorted(set(PROVINCE_OFFICES.values())):
+            office_url = base + office + "/"
+            response = client.get(office_url)
+            if response.status_code != 200:
+                continue
+
+            for time_dir in (href for href in _hrefs(response.text) if href.rstrip("/").isdigit()):
+                for cap in (href for href in _hrefs(client.get(office_url + time_dir).text) if href.endswith(".cap")):
+                    path = RECORDINGS_DIR / "datamart" / office / time_dir.strip("/") / cap
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    path.write_bytes(client.get(office_url + time_dir + cap).content)
+
+            print(f"datamart/{office}: {len(list((RECORDINGS_DIR / 'datamart' / office).rglob('*.cap')))} CAP files")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--open-meteo-port", type=int, default=OPEN_METEO_PORT)
+    parser.add_argument("--datamart-port", type=int, default=DATAMART_PORT)
+    parser.add_argument("--open-meteo-latency", type=float, default=OPEN_METEO_LATENCY_MS, help="ms per request")
+    parser.add_argument("--datamart-latency", type=float, default=DATAMART_LATENCY_MS, help="ms per request")
+    parser.add_argument("--jitter", type=float, default=JITTER_MS, help="± ms around each latency")
+    parser.add_argument("--record", action="store_true", help="save real upstream responses to replay")
+    args = parser.parse_args()
+
+    if args.record:
+        record()
+    else:
+        asyncio.run(serve(args.open_meteo_port, args.datamart_port, args.open_meteo_latency, args.datamart_latency, args.jitter))
@@ -0,0 +1,136 @@
+import random
+from datetime import date, datetime, timedelta, timezone
+
+# ---------------- CONFIG ----------------
+
+SEED = 42
+
+# One week and a three-winter span, both starting on a Monday
+WEEK = ("2025-01-06", "2025-01-12")
+SEASONS = ("2021-11-01", "2024-03-31")
+
+WEATHER_CODES = [0, 1, 2, 3, 45, 51, 53, 61, 63, 66, 71, 73, 75, 77, 85, 86]
+
+# ----------------------------------------
+
+
+def open_meteo_response(start_date: str, end_date: str, seed: int = SEED, missing: float = 0.01) -> dict:
+    """
+    A deterministic stand-in for an Open-Meteo forecast/archive response
+    covering start_date → end_date, with a sprinkling of missing (None) values.
+    """
+    rnd = random.Random(seed)
+
+    start = date.fromisoformat(start_date)
+    days = (date.fromisoformat(end_date) - start).days + 1
+    hours = days * 24
+
+    def series(make):
+        return [None if rnd.random() < missing else make() for _ in range(hours)]
+
+    hourly = {
+        "time": [
+            f"{(start + timedelta(days=d)).isoformat()}T{h:02d}:00"
+            for d in range(days)
+            for h in range(24)
+        ],
+        "temperature_2m": series(lambda: round(rnd.uniform(-25, 8), 1)),
+        "dew_point_2m": series(lambda: round(rnd.uniform(-30, 3), 1)),
+        "precipitation": series(lambda: round(max(0.0, rnd.gauss(0, 1.2)), 1)),
+        "snowfall": series(lambda: round(max(0.0, rnd.gauss(0, 0.8)), 2)),
+        "weather_code": series(lambda: rnd.choice(WEATHER_CODES)),
+        "wind_speed_10m": series(lambda: round(rnd.uniform(0, 55), 1)),
+        "wind_gusts_10m": series(lambda: round(rnd.uniform(5, 90), 1)),
+    }
+
+    daily = {
+        "time": [(start + timedelta(days=d)).isoformat() for d in range(days)],
+        "temperature_2m_min": [round(rnd.uniform(-28, 3), 1) for _ in range(days)],
+        "wind_gusts_10m_max": [round(rnd.uniform(10, 100), 1) for _ in range(days)],
+    }
+
+    return {
+        "latitude": 44.55,
+        "longitude": -80.95,
+        "timezone": "America/New_York",
+        "hourly": hourly,
+        "daily": daily,
+    }
+
+
+def redate_response(data: dict, start_date: str, end_date: str) -> dict:
+    """
+    A recorded Open-Meteo response stretched or cut to start_date → end_date,
+    repeating its days in order, so one recording can answer any window.
+    """
+    start = date.fromisoformat(start_date)
+    days = (date.fromisoformat(end_date) - start).days + 1
+    recorded_days = len(data["daily"]["time"])
+
+    def tile(values, per_day):
+        return [values[(d % recorded_days) * per_day + i] for d in range(days) for i in range(per_day)]
+
+    hourly = {key: tile(values, 24) for key, values in data["hourly"].items() if key != "time"}
+    daily = {key: tile(values, 1) for key, values in data["daily"].items() if key != "time"}
+
+    hourly["time"] = [
+        f"{(start + timedelta(days=d)).isoformat()}T{h:02d}:00"
+        for d in range(days)
+        for h in range(24)
+    ]
+    daily["time"] = [(start + timedelta(days=d)).isoformat() for d in range(days)]
+
+    return {**data, "hourly": hourly, "daily": daily}
+
+
+def cap_alert(event: str, box: tuple, hours: float = 12) -> bytes:
+    """A CAP file with one English alert covering box = (min_lat, min_lon, max_lat, max_lon)."""
+    now = datetime.now(timezone.utc)
+    onset = (now - timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%S-00:00")
+    expires = (now + timedelta(hours=hours)).strftime("%Y-%m-%dT%H:%M:%S-00:00")
+
+    min_lat, min_lon, max_lat, max_lon = box
+    polygon = " ".join(
+        f"{lat},{lon}"
+        for lat, lon in [(min_lat, min_lon), (max_lat, min_lon), (max_lat, max_lon), (min_lat, max_lon), (min_lat, min_lon)]
+    )
+
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<alert xmlns="urn:oasis:names:tc:emergency:cap:1.2">
+  <info>
+    <language>en-CA</language>
+    <event>{event}</event>
+    <urgency>Future</urgency>
+    <severity>Moderate</severity>
+    <onset>{onset}</onset>
+    <expires>{expires}</expires>
+    <description>{event} in effect.</description>
+    <instruction>Travel may be hazardous.</instruction>
+    <area><areaDesc>Benchmark - Region</areaDesc><polygon>{polygon}</polygon></area>
+  </info>
+  <info>
+    <language>fr-CA</language>
+    <event>{event}</event>
+  </info>
+</alert>
+""".encode()
+
+
+def datamart_tree(offices: dict, time_dirs: int = 3, caps_per_dir: int = 2, seed: int = SEED) -> dict:
+    """
+    A Datamart CAP directory tree as {"OFFICE/HHMM/file.cap": bytes}, with
+    alerts scattered over each office's box (min_lat, min_lon, max_lat, max_lon).
+    """
+    rnd = random.Random(seed)
+    events = ["snowfall", "blowing snow", "cold", "freezing rain", "weather", "fog"]
+
+    tree = {}
+    for office, (min_lat, min_lon, max_lat, max_lon) in offices.items():
+        for t in range(time_dirs):
+            for c in range(caps_per_dir):
+                lat = rnd.uniform(min_lat, max_lat - 2)
+                lon = rnd.uniform(min_lon, max_lon - 3)
+                box = (lat, lon, lat + 2, lon + 3)
+                tree[f"{office}/{t * 200 + 1000:04d}/alert_{t}_{c}.cap"] = cap_alert(rnd.choice(events), box)
+
+    return tree
@@ -0,0 +1,262 @@
+"""
+Load test for the API against local stand-ins for every upstream. Starts the
+fake Open-Meteo and Datamart servers and the API (pointed at them through
+OPEN_METEO_FORECAST_URL, OPEN_METEO_ARCHIVE_URL and DATAMART_URL, so calls
+to them spend the same upstream budgets), drives each endpoint at a fixed
+request rate, and reports latency percentiles, throughput and errors. Runs
+entirely offline. Exits non-zero if any endpoint's error rate is over
+--max-error-rate.
+
+    cd api && python -m benchmarks.loadtest [--rps 20] [--duration 30] [--endpoints predict,alert]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+from benchmarks.bench_startup import API_DIR, free_port
+
+# ---------------- CONFIG ----------------
+
+# Requests per second sent to each endpoint
+RPS = 20
+DURATION = 30  # seconds measured
+# Seconds of load before measuring starts, reported on their own. 0 by
+# default: a cold start is what the first users after a deploy get
+WARMUP = 0
+
+# Distinct places users ask about; fewer means more cache hits
+LOCATIONS = 200
+
+# Southern Ontario and Quebec, where most traffic comes from
+AREA = (42.0, -83.0, 47.0, -71.0)  # min_lat, min_lon, max_lat, max_lon
+
+ENDPOINTS = {
+    "predict": "/predict",
+    "forecast": "/forecast",
+    "explain": "/explain",
+    "alert": "/alert",
+    "count": "/count",
+}
+DEFAULT_ENDPOINTS = ["predict", "explain", "alert", "count"]
+
+# Requests still unanswered beyond this are counted as errors
+REQUEST_TIMEOUT = 30
+
+# Cap on requests in flight, so an overwhelmed server can't run the generator out of sockets
+MAX_IN_FLIGHT = 2000
+
+MAX_ERROR_RATE = 0.01
+
+STARTUP_TIMEOUT = 60
+
+# ----------------------------------------
+
+
+def wait_for(url, process, timeout=STARTUP_TIMEOUT):
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.05)
+    raise RuntimeError(f"{url} not up within {timeout}s")
+
+
+def start_servers(args, workdir):
+    open_meteo_port, datamart_port, api_port = free_port(), free_port(), free_port()
+
+    fakes = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.fake_upstreams",
+            "--open-meteo-port", str(open_meteo_port),
+            "--datamart-port", str(datamart_port),
+            "--open-meteo-latency", str(args.open_meteo_latency),
+            "--datamart-latency", str(args.datamart_latency),
+        ],
+        cwd=API_DIR,
+    )
+    wait_for(f"http://127.0.0.1:{open_meteo_port}/", fakes)
+    wait_for(f"http://127.0.0.1:{datamart_port}/", fakes)
+
+    env = {
+        **os.environ,
+        "OPEN_METEO_FORECAST_URL": f"http://127.0.0.1:{open_meteo_port}/v1/forecast",
+        "OPEN_METEO_ARCHIVE_URL": f"http://127.0.0.1:{open_meteo_port}/v1/archive",
+        "DATAMART_URL": f"http://127.0.0.1:{datamart_port}",
+        "PREDICTION_GRID": "1" if args.grid else "0",
+        # Keep the real visit count out of it
+        "COUNTER_PATH": str(Path(workdir) / "counter.csv"),
+        "COUNTER_SHARED_PATH": str(Path(workdir) / "counter.shm"),
+    }
+
+    api = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(api_port),
+            "--workers", str(args.workers), "--log-level", "warning",
+        ],
+        cwd=API_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL if args.quiet else None,
+    )
+    wait_for(f"http://127.0.0.1:{api_port}/docs", api)
+
+    return f"http://127.0.0.1:{api_port}", [api, fakes]
+
+
+class Results:
+    def __init__(self):
+        self.latencies = []  # seconds, successful requests only
+        self.errors = {}     # status code or exception name -> count
+
+    def record(self, latency, error=None):
+        if error is None:
+            self.latencies.append(latency)
+        else:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+    def summary(self, duration) -> dict:
+        ok = len(self.latencies)
+        failed = sum(self.errors.values())
+        latencies = np.array(self.latencies) * 1000
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if ok else (np.nan,) * 3
+
+        return {
+            "requests": ok + failed,
+            "errors": failed,
+            "error_rate": failed / (ok + failed) if ok + failed else 0.0,
+            "error_kinds": {str(kind): count for kind, count in self.errors.items()},
+            "throughput": ok / duration,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(latencies.max()) if ok else float("nan"),
+        }
+
+
+async def drive(base_url, endpoints, rps, duration, warmup, locations, seed=42):
+    """
+    Open-loop load: requests go out on a fixed schedule whether or not earlier
+    ones have come back, and latency is measured from when each was due. A
+    slow server therefore shows up as latency instead of as a lower request rate.
+    Returns ({endpoint: summary} for the measured window, the same for the warmup).
+    """
+    rnd = random.Random(seed)
+    min_lat, min_lon, max_lat, max_lon = AREA
+    places = [
+        (round(rnd.uniform(min_lat, max_lat), 4), round(rnd.uniform(min_lon, max_lon), 4))
+        for _ in range(locations)
+    ]
+
+    results = {name: Results() for name in endpoints}
+    warmup_results = {name: Results() for name in endpoints}
+    in_flight = asyncio.Semaphore(MAX_IN_FLIGHT)
+    limits = httpx.Limits(max_connections=MAX_IN_FLIGHT, max_keepalive_connections=200)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=REQUEST_TIMEOUT, limits=limits) as client:
+
+        async def one(name, due, results):
+            lat, lon = rnd.choice(places)
+            params = {} if name == "count" else {"lat": lat, "lon": lon}
+
+            async with in_flight:
+                error = None
+                try:
+                    response = await client.get(ENDPOINTS[name], params=params)
+                    if response.status_code != 200:
+                        error = response.status_code
+                except httpx.HTTPError as e:
+                    error = type(e).__name__
+
+            results[name].record(time.perf_counter() - due, error)
+
+        loop_start = time.perf_counter()
+        interval = 1 / (rps * len(endpoints))
+        total = int((warmup + duration) * rps * len(endpoints))
+        tasks = []
+
+        for i in range(total):
+            due = loop_start + i * interval
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            name = endpoints[i % len(endpoints)]
+            phase = results if i * interval >= warmup else warmup_results
+            tasks.append(asyncio.create_task(one(name, due, phase)))
+
+        await asyncio.gather(*tasks)
+
+    return (
+        {name: result.summary(duration) for name, result in results.items()},
+        {name: result.summary(warmup) for name, result in warmup_results.items()} if warmup else None,
+    )
+
+
+def print_report(report, rps, duration, label=""):
+    print(f"\n{label}{rps} req/s per endpoint for {duration}s\n")
+    print(f"  {'endpoint':<10} {'requests':>8} {'errors':>8} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, s in report.items():
+        print(
+            f"  {name:<10} {s['requests']:>8} {s['error_rate']:>7.1%} {s['throughput']:>7.1f} "
+            f"{s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f} {s['max_ms']:>8.1f}"
+        )
+        if s["error_kinds"]:
+            print(f"  {'':<10} {s['error_kinds']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rps", type=float, default=RPS, help="requests per second per endpoint")
+    parser.add_argument("--duration", type=float, default=DURATION)
+    parser.add_argument("--warmup", type=float, default=WARMUP)
+    parser.add_argument("--endpoints", default=",".join(DEFAULT_ENDPOINTS), help=f"any of {','.join(ENDPOINTS)}")
+    parser.add_argument("--locations", type=int, default=LOCATIONS)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--open-meteo-latency", type=float, default=80, help="ms")
+    parser.add_argument("--datamart-latency", type=float, default=40, help="ms")
+    parser.add_argument("--grid", action="store_true", help="run the prediction grid refresher too")
+    parser.add_argument("--max-error-rate", type=float, default=MAX_ERROR_RATE)
+    parser.add_argument("--json", help="also write the report here")
+    parser.add_argument("--quiet", action="store_true", help="hide the API's own output")
+    args = parser.parse_args()
+
+    endpoints = args.endpoints.split(",")
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        sys.exit(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        base_url, processes = start_servers(args, workdir)
+        try:
+            report, warmup_report = asyncio.run(drive(base_url, endpoints, args.rps, args.duration, args.warmup, args.locations))
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+
+    if warmup_report:
+        print_report(warmup_report, args.rps, args.warmup, label="warmup: ")
+    print_report(report, args.rps, args.duration)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(
+            {"rps": args.rps, "duration": args.duration, "endpoints": report, "warmup": warmup_report}, indent=2,
+        ))
+
+    over = [name for name, s in report.items() if s["error_rate"] > args.max_error_rate]
+    if over:
+        sys.exit(f"error rate over {args.max_error_rate:.1%} on: {', '.join(over)}")
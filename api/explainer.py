@@ -1,83 +1,68 @@
 
-def GetExplanations(data, model):
+import weakref
+
+import numpy as np
+
+# One TreeExplainer per loaded model, dropped along with the model itself
+_EXPLAINERS = weakref.WeakKeyDictionary()
+
+
+def GetExplainer(model):
     import shap
 
-    explainer = shap.TreeExplainer(
-        model,
-        model_output="raw"
-    )
+    explainer = _EXPLAINERS.get(model)
+    if explainer is None:
+        explainer = shap.TreeExplainer(
+            model,
+            model_output="raw"
+        )
+        _EXPLAINERS[model] = explainer
+    return explainer
 
-    explanations = {}
+def HasExplainer(model) -> bool:
+    return model in _EXPLAINERS
+
+def GetExplanations(data, model):
+    """
+    Top snow, wind and other factors behind each row's snow-day probability,
+    keyed by the row's index. SHAP values for every row come from one call.
+    """
+    features = list(data.columns)
+    values = data.to_numpy(dtype=float)
+
+    # (rows × features × classes) -> contributions towards a snow day
+    shap_values = np.asarray(GetExplainer(model).shap_values(data))[:, :, 1]
+
+    names = np.array(features)
+    snow = np.char.find(names, "snow") >= 0
+    precip = np.char.find(names, "precip") >= 0
+    wind = np.char.find(names, "wind") >= 0
+    eligible = ~(np.char.startswith(names, "weather_code") | (np.char.find(names, "last") >= 0))
+
+    groups = [
+        eligible & (snow | precip),
+        eligible & wind,
+        eligible & ~snow & ~wind & ~precip,
+    ]
 
-    for i in data.index:
-        row = data.loc[[i]]  # keep 2D
-
-        # shap_values = explainer(row)
-        #
-        # exp = shap.Explanation(
-        #     values=shap_values.values[0, :, 1],
-        #     base_values=shap_values.base_values[0, 1],
-        #     data=row.iloc[0],
-        #     feature_names=row.columns
-        # )
-        #
-        # items = [
-        #     (name, shap_val, value)
-        #     for name, shap_val, value in zip(
-        #         exp.feature_names,
-        #         exp.values,
-        #         exp.data
-        #     )
-        #     if not (name.startswith("weather_code") or name.__contains__("last"))
-        # ]
-        #
-        # # Split by direction
-        # snow_factors = [
-        #     x for x in items
-        #     if "snow" in str(x[0]) or "precip" in str(x[0])
-        # ]
-        #
-        # wind_factors = [
-        #     x for x in items
-        #     if "wind" in str(x[0])
-        # ]
-        #
-        # other_factors = [
-        #     x for x in items
-        #     if "snow" not in str(x[0]) and "wind" not in str(x[0]) and "precip" not in str(x[0])
-        # ]
-        #
-        # # Sort each group
-        # snow_sorted = sorted(snow_factors, key=lambda x: abs(x[1]), reverse=True)
-        # wind_sorted = sorted(wind_factors, key=lambda x: abs(x[1]), reverse=True)
-        # other_sorted = sorted(other_factors, key=lambda x: abs(x[1]), reverse=True)
-        #
-        # top = snow_sorted[:1] + wind_sorted[:1] + other_sorted[:1]
-        #
-        # explanations[i] = [
-        #     {
-        #         "feature": name,
-        #         "impact": round(float(shap_val), 3),
-        #         "value": round(float(value), 2),
-        #         "direction": "up" if shap_val > 0 else "down",
-        #         "humanized_value": HumanizeFeatureValue(name, value, shap_val),
-        #     }
-        #     for name, shap_val, value in top
-        # ]
+    # Strongest factor of each group for every row at once
+    impact = np.abs(shap_values)
+    top = np.stack([np.where(group, impact, -1).argmax(axis=1) for group in groups], axis=1)
 
+    labels = HumanizeFeatureValues(features, values)
+
+    explanations = {}
+
+    for row, i in enumerate(data.index):
         explanations[i] = [
             {
-                "direction": "up",
-                "humanized_value": f"{round(float(row['precipitation_24h']))} cm of Precipitation",
-            },
-            {
-                "direction": "up",
-                "humanized_value": f"{round(float(row['wind_gusts_max_overnight']))} km/h Wind Gusts"
-            },
-            {
-                "direction": "up",
-                "humanized_value": f"{round(float(row['temp_min_overnight']))}°C Min Temp Overnight"
+                "feature": features[column],
+                "impact": round(float(shap_values[row, column]), 3),
+                "value": round(float(values[row, column]), 2),
+                "direction": "up" if shap_values[row, column] > 0 else "down",
+                "humanized_value": labels[row, column],
             }
+            for column in top[row]
         ]
 
     return explanations
@@ -87,18 +72,38 @@ def HumanizeFeatureValue(feature, value, shap_value):
     Convert a raw feature value into a human-friendly label.
     Uses predefined buckets for each feature.
     """
+    return HumanizeFeatureValues([feature], np.array([[value]], dtype=float))[0, 0]
 
-    # Get hour for hourly variables like snowfall_3, etc.
-    time = feature[len(feature)-1:]
-    time = int(time) if time.isdigit() else None
+def HumanizeFeatureValues(features, values):
+    """
+    Labels for a (rows × features) matrix of raw values, bucketed a whole
+    column at a time. Values past a feature's last bucket get None.
+    """
+    labels = np.full(values.shape, None, dtype=object)
 
-    base_feature = feature[:len(feature)-1] if time is not None else feature
+    for column, feature in enumerate(features):
+        # Get hour for hourly variables like snowfall_3, etc.
+        time = feature[len(feature)-1:]
+        time = int(time) if time.isdigit() else None
 
-    for threshold, label in FEATURE_BUCKETS.get(base_feature, []):
-        if value <= threshold:
-            full_label = label if time is None else f"{label} ({time if time != 0 else 12} am)"
-            icon = "⬆️" if shap_value > 0 else "⬇️"
-            return f"{full_label}"
+        base_feature = feature[:len(feature)-1] if time is not None else feature
+
+        buckets = _BUCKETS.get(base_feature)
+        if buckets is None:
+            continue
+
+        thresholds, bucket_labels = buckets
+        if time is not None:
+            bucket_labels = np.array(
+                [None if label is None else f"{label} ({time if time != 0 else 12} am)" for label in bucket_labels],
+                dtype=object,
+            )
+
+        # First bucket whose threshold is >= the value; NaN and values past
+        # the end land on the trailing None
+        labels[:, column] = bucket_labels[np.searchsorted(thresholds, values[:, column], side="left")]
+
+    return labels
 
 FEATURE_BUCKETS = {
 
@@ -243,4 +248,14 @@ FEATURE_BUCKETS = {
         (1, "No Snowfall Overnight"),
         (2, "No Snowfall (24h)"),
     ],
-}
\ No newline at end of file
+}
+
+# Thresholds and labels as arrays for np.searchsorted, with a trailing None
+# for values past the last bucket
+_BUCKETS = {
+    feature: (
+        np.array([threshold for threshold, _ in buckets], dtype=float),
+        np.array([label for _, label in buckets] + [None], dtype=object),
+    )
+    for feature, buckets in FEATURE_BUCKETS.items()
+}
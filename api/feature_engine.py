@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import numpy as np
+from datetime import datetime
+
+# ---------------- CONFIG ----------------
+
+HOURS_PER_DAY = 24
+OVERNIGHT_HOURS = 8       # midnight → 8am
+FREEZING_RAIN_HOURS = 17  # midnight → 5pm
+
+FREEZING_RAIN_CODES = [51, 53, 55, 61, 63, 65, 66, 67]
+SNOW_CODES = [71, 73, 75, 77, 85, 86]
+
+# Layout of the last axis of the (days × 24 × variables) block
+HOURLY_VARIABLES = [
+    "temperature_2m",
+    "dew_point_2m",
+    "precipitation",
+    "snowfall",
+    "weather_code",
+    "wind_speed_10m",
+    "wind_gusts_10m",
+]
+
+# ----------------------------------------
+
+TEMP, DEW, PRECIP, SNOW, CODE, WIND, GUSTS = range(len(HOURLY_VARIABLES))
+
+
+def _sum(values):
+    """
+    Sums the last axis left to right, skipping missing values, so results are
+    bit-for-bit what the built-in sum() gives (np.sum reorders the additions).
+    """
+    values = np.nan_to_num(values, nan=0.0)
+    if values.shape[-1] == 0:
+        return np.zeros(values.shape[:-1])
+    return np.cumsum(values, axis=-1)[..., -1]
+
+def _mean(values):
+    counts = (~np.isnan(values)).sum(axis=-1)
+    return np.where(counts > 0, _sum(values) / np.maximum(counts, 1), 0)
+
+
+def hourly_block(hourly, dates):
+    """
+    Reshapes the hourly arrays into a (days × 24 × variables) block for the
+    given date strings. Returns None if the response doesn't split into
+    whole 24-hour days or is missing one of the dates.
+    """
+    hour_dates = np.asarray(hourly["time"], dtype="U16").astype("U10")
+
+    if len(hour_dates) == 0 or len(hour_dates) % HOURS_PER_DAY:
+        return None
+
+    hour_dates = hour_dates.reshape(-1, HOURS_PER_DAY)
+    if not (hour_dates == hour_dates[:, :1]).all():
+        return None
+
+    day_index = _find(hour_dates[:, 0], dates)
+    if day_index is None:
+        return None
+
+    block = np.stack(
+        [np.asarray(hourly[key], dtype=float).reshape(-1, HOURS_PER_DAY) for key in HOURLY_VARIABLES],
+        axis=-1,
+    )
+    return block[day_index]
+
+def daily_columns(daily, dates):
+    """Each daily variable as an array aligned to the given date strings, or None if a date is missing."""
+    day_index = _find(np.asarray(daily["time"], dtype="U10"), dates)
+    if day_index is None:
+        return None
+
+    return {
+        key: np.asarray(values, dtype=float)[day_index]
+        for key, values in daily.items()
+        if key != "time"
+    }
+
+def _find(sorted_dates, dates):
+    """Index of the first occurrence of each date, or None if any is missing."""
+    index = np.searchsorted(sorted_dates, dates)
+    if (index >= len(sorted_dates)).any():
+        return None
+    if (sorted_dates[index] != dates).any():
+        return None
+    return index
+
+
+def build_features(hourly, daily, start_dt: datetime, end_dt: datetime, snow_days=()) -> pd.DataFrame:
+    """
+    Builds one row per weekday between start_dt and end_dt (inclusive) with
+    array operations over the whole range at once. Rows match the per-day
+    builder exactly. Returns None if the response can't be reshaped into whole
+    days, so the caller can fall back to it.
+    """
+    import pandas as pd
+
+    days = np.arange(
+        np.datetime64(start_dt.date(), "D"),
+        np.datetime64(end_dt.date(), "D") + 1,
+    )
+    dates = days.astype("U10")
+
+    block = hourly_block(hourly, dates)
+    daily_values = daily_columns(daily, dates)
+    if block is None or daily_values is None:
+        return None
+
+    temp = block[:, :, TEMP]
+    dew = block[:, :, DEW]
+    precip = block[:, :, PRECIP]
+    snow = block[:, :, SNOW]
+    codes = block[:, :, CODE]
+    wind = block[:, :, WIND]
+    gusts = block[:, :, GUSTS]
+
+    temp_min = daily_values["temperature_2m_min"]
+    gusts_max = daily_values["wind_gusts_10m_max"]
+
+    snowfall_overnight = _sum(snow[:, :OVERNIGHT_HOURS])
+    snowfall_24h = _sum(snow)
+
+    # Yesterday is the previous calendar day; the first day in range has none
+    has_yesterday = np.arange(len(days)) > 0
+    yesterday_snow = np.roll(snow, 1, axis=0)
+
+    snowfall_last_24h = np.where(has_yesterday, _sum(yesterday_snow[:, 7:]) + snowfall_overnight, 0)
+    snowfall_last_12h = np.where(has_yesterday, _sum(yesterday_snow[:, 20:]) + snowfall_overnight, 0)
+
+    no_snowfall_penalty = np.where(
+        snowfall_24h == 0, 2,
+        np.where(snowfall_overnight < 1, 1, 0),
+    )
+
+    freezing_rain = (
+        np.isin(codes[:, :FREEZING_RAIN_HOURS], FREEZING_RAIN_CODES).any(axis=1)
+        & (temp_min >= -2)
+        & (temp_min <= 1)
+    )
+
+    # Every weather_code column flags snow anywhere in the day, not just that hour
+    snow_codes = np.isin(codes, SNOW_CODES).any(axis=1)
+
+    weekdays = np.is_busday(days)
+
+    columns = {
+        "date": dates,
+        "snow_day": np.isin(days, np.asarray(snow_days, dtype="datetime64[D]")).astype(int),
+
+        "snowfall_last_24h": snowfall_last_24h,
+        "snowfall_last_12h": snowfall_last_12h,
+        "snowfall_overnight": snowfall_overnight,
+        "snowfall_24h": snowfall_24h,
+
+        "precipitation_overnight": _sum(precip[:, :OVERNIGHT_HOURS]),
+        "precipitation_24h": _sum(precip),
+
+        "no_snowfall_penalty": no_snowfall_penalty,
+        "freezing_rain": freezing_rain,
+
+        "temp_min_overnight": temp_min,
+        "wind_speed_avg_overnight": _mean(wind[:, :OVERNIGHT_HOURS]),
+        "wind_gusts_max_overnight": gusts_max,
+        "dewpoint_avg_overnight": _mean(dew[:, :OVERNIGHT_HOURS]),
+    }
+
+    # first 8 hours
+    for h in range(OVERNIGHT_HOURS):
+        columns[f"temperature{h}"] = temp[:, h]
+        columns[f"precipitation{h}"] = precip[:, h]
+        columns[f"snowfall{h}"] = snow[:, h]
+        columns[f"wind_speed{h}"] = wind[:, h]
+        columns[f"wind_gusts{h}"] = gusts[:, h]
+        columns[f"weather_code{h}"] = snow_codes
+
+    df = pd.DataFrame({name: values[weekdays] for name, values in columns.items()})
+    df["date"] = dates[weekdays].tolist()
+    return df
@@ -0,0 +1,179 @@
+"""
+The model's inputs in one place: column order, compact dtypes, and a binary
+dataset format. Training, backtesting and serving all read features through
+here, so a column can't go missing or move in just one of them.
+
+    python feature_schema.py data/training_dataset_6.csv   # -> .npz next to it
+"""
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+
+from feature_engine import OVERNIGHT_HOURS
+
+# ---------------- CONFIG ----------------
+
+SUMMARY_FEATURES = [
+    ("snowfall_last_24h", np.float32),
+    ("snowfall_last_12h", np.float32),
+    ("snowfall_overnight", np.float32),
+    ("snowfall_24h", np.float32),
+    ("precipitation_overnight", np.float32),
+    ("precipitation_24h", np.float32),
+    ("no_snowfall_penalty", np.uint8),
+    ("freezing_rain", np.bool_),
+    ("temp_min_overnight", np.float32),
+    ("wind_speed_avg_overnight", np.float32),
+    ("wind_gusts_max_overnight", np.float32),
+    ("dewpoint_avg_overnight", np.float32),
+]
+
+# Repeated for every overnight hour, as temperature0, precipitation0, ...
+HOURLY_FEATURES = [
+    ("temperature", np.float32),
+    ("precipitation", np.float32),
+    ("snowfall", np.float32),
+    ("wind_speed", np.float32),
+    ("wind_gusts", np.float32),
+    ("weather_code", np.bool_),
+]
+
+# Columns that travel with the features but are never model inputs
+LABEL = "snow_day"
+ID_COLUMNS = ["location", "board", "lat", "lon", "date"]
+
+# ----------------------------------------
+
+FEATURES = SUMMARY_FEATURES + [
+    (f"{name}{h}", dtype)
+    for h in range(OVERNIGHT_HOURS)
+    for name, dtype in HOURLY_FEATURES
+]
+
+FEATURE_NAMES = [name for name, _ in FEATURES]
+
+# Booleans that went through a CSV come back as strings
+_BOOLEANS = {"True": True, "False": False, True: True, False: False}
+
+
+def check_feature_names(names):
+    """Raises if a model expects different inputs, or the same ones in another order."""
+    names = [str(name) for name in names]
+    if names != FEATURE_NAMES:
+        missing = sorted(set(FEATURE_NAMES) - set(names))
+        extra = sorted(set(names) - set(FEATURE_NAMES))
+        raise ValueError(f"model features don't match the schema (missing {missing}, extra {extra}, or reordered)")
+
+
+def _column(values: pd.Series, dtype):
+    if dtype is np.bool_ and values.dtype == object:
+        values = values.map(_BOOLEANS)
+    return values.to_numpy(dtype=dtype)
+
+def feature_frame(data: pd.DataFrame) -> pd.DataFrame:
+    """The model's columns only, in schema order and compact dtypes."""
+    import pandas as pd
+
+    return pd.DataFrame(
+        {name: _column(data[name], dtype) for name, dtype in FEATURES},
+        index=data.index,
+    )
+
+def feature_matrix(data: pd.DataFrame) -> np.ndarray:
+    """The model's columns as one contiguous float32 (rows × features) matrix."""
+    X = np.empty((len(data), len(FEATURES)), dtype=np.float32)
+    for j, (name, dtype) in enumerate(FEATURES):
+        X[:, j] = _column(data[name], dtype)
+    return X
+
+
+class Dataset:
+    """
+    A training set as one float32 feature matrix, uint8 labels and whichever
+    id columns it had. Saved as a single uncompressed .npz, so loading it is a
+    straight read into arrays the forest can use as-is.
+    """
+
+    def __init__(self, X: np.ndarray, y: np.ndarray = None, ids: dict = None):
+        self.X = X
+        self.y = y
+        self.ids = ids or {}
+
+    def __len__(self):
+        return len(self.X)
+
+    @property
+    def nbytes(self) -> int:
+        return self.X.nbytes + (self.y.nbytes if self.y is not None else 0) + sum(a.nbytes for a in self.ids.values())
+
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame) -> "Dataset":
+        y = data[LABEL].to_numpy(dtype=np.uint8) if LABEL in data else None
+        ids = {
+            column: data[column].to_numpy(dtype=str if data[column].dtype == object else None)
+            for column in ID_COLUMNS
+            if column in data
+        }
+        return cls(feature_matrix(data), y, ids)
+
+    def frame(self) -> pd.DataFrame:
+        """Features as a DataFrame in compact dtypes, for sklearn and shap."""
+        import pandas as pd
+
+        return pd.DataFrame({
+            name: self.X[:, j].astype(dtype)
+            for j, (name, dtype) in enumerate(FEATURES)
+        })
+
+    def labels(self) -> pd.Series:
+        import pandas as pd
+
+        return pd.Series(self.y, name=LABEL)
+
+    def save(self, path):
+        arrays = {"X": self.X, "features": np.array(FEATURE_NAMES)}
+        if self.y is not None:
+            arrays["y"] = self.y
+        arrays.update({f"id_{column}": values for column, values in self.ids.items()})
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path) -> "Dataset":
+        with np.load(path) as arrays:
+            check_feature_names(arrays["features"])
+            return cls(
+                arrays["X"],
+                arrays["y"] if "y" in arrays.files else None,
+                {key[len("id_"):]: arrays[key] for key in arrays.files if key.startswith("id_")},
+            )
+
+
+def read_dataset(path) -> Dataset:
+    """A .npz dataset, or a training CSV parsed through the schema."""
+    import pandas as pd
+
+    path = Path(path)
+    if path.suffix == ".npz":
+        return Dataset.load(path)
+    return Dataset.from_frame(pd.read_csv(path))
+
+
+if __name__ == "__main__":
+    import sys
+
+    import pandas as pd
+
+    for csv_path in sys.argv[1:]:
+        data = pd.read_csv(csv_path)
+        dataset = Dataset.from_frame(data)
+
+        npz_path = Path(csv_path).with_suffix(".npz")
+        dataset.save(npz_path)
+
+        print(
+            f"{csv_path}: {len(dataset)} rows, "
+            f"{data.memory_usage(deep=True).sum() / 1024:.0f} KB as a frame -> "
+            f"{dataset.nbytes / 1024:.0f} KB in {npz_path}"
+        )
@@ -0,0 +1,123 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# ---------------- CONFIG ----------------
+
+# Open-Meteo's forecast models run on roughly a 0.1° grid, so every user
+# inside the same cell gets the same forecast back anyway.
+GRID_RESOLUTION = 0.1
+
+# Open-Meteo refreshes its forecast models every hour and publishes the new
+# run a few minutes after the hour.
+MODEL_REFRESH_SECONDS = 60 * 60
+MODEL_REFRESH_DELAY = 10 * 60
+
+# How long past its expiry an entry can still be served while it refreshes
+STALE_SECONDS = 3 * 60 * 60
+
+# Each entry is ~8 days of hourly data (~30 KB), so this caps us at ~60 MB
+MAX_ENTRIES = 2048
+
+# ----------------------------------------
+
+
+def grid_cell(lat: float, lon: float) -> tuple:
+    """Quantize a coordinate to the index of its grid cell."""
+    return (
+        math.floor(lat / GRID_RESOLUTION),
+        math.floor(lon / GRID_RESOLUTION),
+    )
+
+def cell_center(cell: tuple) -> tuple:
+    lat_index, lon_index = cell
+    return (
+        round((lat_index + 0.5) * GRID_RESOLUTION, 4),
+        round((lon_index + 0.5) * GRID_RESOLUTION, 4),
+    )
+
+def next_model_refresh(now: float) -> float:
+    """Timestamp at which the next upstream model run becomes available."""
+    run_start = (now - MODEL_REFRESH_DELAY) // MODEL_REFRESH_SECONDS * MODEL_REFRESH_SECONDS
+    return run_start + MODEL_REFRESH_SECONDS + MODEL_REFRESH_DELAY
+
+
+class ForecastCache:
+    """
+    Bounded LRU of upstream forecasts keyed by (grid cell, date window).
+
+    Entries are fresh until the next upstream model run, then stale for
+    STALE_SECONDS (served, but the caller should revalidate), then dropped.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, stale_seconds=STALE_SECONDS, clock=time.time):
+        self.max_entries = max_entries
+        self.stale_seconds = stale_seconds
+        self.clock = clock
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Returns (value, is_fresh). value is None on a miss."""
+        now = self.clock()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None, False
+
+            value, expires = entry
+
+            if now >= expires + self.stale_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None, False
+
+            self._entries.move_to_end(key)
+
+            if now < expires:
+                self.hits += 1
+                return value, True
+
+            self.stale_hits += 1
+            return value, False
+
+    def put(self, key, value):
+        expires = next_model_refresh(self.clock())
+
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0,
+            }
@@ -0,0 +1,145 @@
+import numpy as np
+
+# ---------------- CONFIG ----------------
+
+# Rows scored per traversal pass; bounds the (rows × trees) working arrays
+CHUNK_ROWS = 4096
+
+# ----------------------------------------
+
+
+def export_forest(model) -> dict:
+    """
+    Flattens a fitted RandomForestClassifier into contiguous node arrays.
+
+    Every tree's nodes are concatenated and child indices are made global.
+    Leaves point back at themselves, so a traversal can run a fixed number of
+    steps without checking where each row has ended up.
+    """
+    features, thresholds, lefts, rights, missing_lefts, values, roots = [], [], [], [], [], [], []
+    offset = 0
+
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        nodes = np.arange(tree.node_count)
+        is_leaf = tree.children_left == -1
+
+        # Probability of a snow day at each node, normalized the way predict_proba does
+        counts = tree.value[:, 0, :]
+        totals = counts.sum(axis=1)
+        totals[totals == 0] = 1
+
+        roots.append(offset)
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(_float32_floor(np.where(is_leaf, np.inf, tree.threshold)))
+        lefts.append(np.where(is_leaf, nodes, tree.children_left) + offset)
+        rights.append(np.where(is_leaf, nodes, tree.children_right) + offset)
+        missing_lefts.append(tree.missing_go_to_left)
+        values.append(counts[:, 1] / totals)
+
+        offset += tree.node_count
+
+    return {
+        "feature": np.concatenate(features).astype(np.int32),
+        "threshold": np.concatenate(thresholds).astype(np.float32),
+        "left": np.concatenate(lefts).astype(np.int32),
+        "right": np.concatenate(rights).astype(np.int32),
+        "missing_left": np.concatenate(missing_lefts).astype(np.uint8),
+        "value": np.concatenate(values).astype(np.float32),
+        # Both children of node i at 2i / 2i+1, so each traversal step is a single
+        # gather; 64-bit so indexing never has to convert them
+        "children": np.column_stack([np.concatenate(lefts), np.concatenate(rights)]).astype(np.int64).ravel(),
+        "roots": np.array(roots, dtype=np.int32),
+        "max_depth": np.array(max(e.tree_.max_depth for e in model.estimators_), dtype=np.int32),
+        "feature_names": np.asarray(model.feature_names_in_, dtype=str),
+    }
+
+def _float32_floor(thresholds):
+    """
+    sklearn compares float32 features against float64 thresholds. Rounding each
+    threshold down to the nearest float32 keeps `x <= threshold` exact, since
+    no float32 value lies between the two.
+    """
+    rounded = thresholds.astype(np.float32)
+    too_high = rounded.astype(np.float64) > thresholds
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+
+class FlatForest:
+    """
+    predict_proba over exported node arrays. All rows walk all trees together,
+    one level per step, so the cost is a handful of array operations per level
+    rather than per-tree Python and joblib overhead.
+    """
+
+    classes_ = np.array([0, 1])
+
+    def __init__(self, arrays: dict):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.missing_left = arrays["missing_left"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.max_depth = int(arrays["max_depth"])
+        self.feature_names_in_ = arrays["feature_names"]
+
+        # Arrays are used as given, so memory-mapped ones are never copied.
+        # Exports from before "children" existed get it built here
+        if "children" in arrays:
+            self.children = arrays["children"]
+        else:
+            self.children = np.column_stack([self.left, self.right]).astype(np.int64).ravel()
+
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_features_in_(self) -> int:
+        return len(self.feature_names_in_)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            array.nbytes
+            for array in (self.feature, self.threshold, self.left, self.right, self.missing_left, self.value, self.roots, self.children)
+        )
+
+    def predict_proba(self, X) -> np.ndarray:
+        X = self._as_matrix(X)
+        proba = np.empty(len(X))
+
+        for start in range(0, len(X), CHUNK_ROWS):
+            proba[start:start + CHUNK_ROWS] = self._predict_chunk(X[start:start + CHUNK_ROWS])
+
+        return np.column_stack([1 - proba, proba])
+
+    def _predict_chunk(self, X):
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        row_offsets = (np.arange(n_rows) * n_features)[:, None]
+        has_missing = np.isnan(flat_X).any()
+
+        nodes = np.repeat(self.roots[None, :], n_rows, axis=0).astype(np.intp)
+
+        for _ in range(self.max_depth):
+            x = flat_X[row_offsets + self.feature[nodes]]
+
+            # NaN fails every comparison, so it goes right unless the node sends missing values left
+            go_right = ~(x <= self.threshold[nodes])
+            if has_missing:
+                go_right &= ~(np.isnan(x) & self.missing_left[nodes].astype(bool))
+
+            nodes = self.children[2 * nodes + go_right]
+
+        return self.value[nodes].mean(axis=1, dtype=np.float64)
+
+    def _as_matrix(self, X):
+        # Select by name so column order can't silently differ from training
+        if hasattr(X, "columns"):
+            X = X[list(self.feature_names_in_)]
+        return np.ascontiguousarray(X, dtype=np.float32)
+
@@ -0,0 +1,97 @@
+import asyncio
+from urllib.parse import urlsplit
+
+import httpx
+
+from metrics import UPSTREAM_ERRORS, UPSTREAM_REQUESTS, UPSTREAM_SECONDS
+from upstream_scheduler import SCHEDULER
+
+# ---------------- CONFIG ----------------
+
+TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.5  # seconds, doubled after every attempt
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# One keep-alive pool per upstream host
+POOL_LIMITS = {
+    "api.open-meteo.com": httpx.Limits(max_connections=20, max_keepalive_connections=10),
+    "archive-api.open-meteo.com": httpx.Limits(max_connections=10, max_keepalive_connections=5),
+    "dd.weather.gc.ca": httpx.Limits(max_connections=8, max_keepalive_connections=8),
+}
+DEFAULT_LIMITS = httpx.Limits(max_connections=10, max_keepalive_connections=5)
+
+# ----------------------------------------
+
+# host[:port] -> (client, event loop it belongs to)
+_CLIENTS = {}
+
+
+def get_client(host: str) -> httpx.AsyncClient:
+    """
+    Returns the pooled client for a host (or host:port), creating it on first use.
+
+    Connections are tied to the event loop that opened them, so scripts that
+    call asyncio.run() more than once get a fresh client per loop.
+    """
+    loop = asyncio.get_running_loop()
+
+    entry = _CLIENTS.get(host)
+    if entry is not None and entry[1] is loop:
+        return entry[0]
+
+    client = httpx.AsyncClient(
+        timeout=TIMEOUT,
+        limits=POOL_LIMITS.get(host, DEFAULT_LIMITS),
+        follow_redirects=True,
+    )
+    _CLIENTS[host] = (client, loop)
+    return client
+
+
+async def get(url: str, params=None, headers=None, priority=None, cost: float = 1) -> httpx.Response:
+    """
+    GET with retries on connection errors and retryable statuses.
+    The last response is returned as-is, whatever its status.
+
+    Every attempt spends `cost` from the host's budget in upstream_scheduler,
+    queued at `priority` (by default whatever the calling context set). Raises
+    UpstreamBusy if the budget can't make room in time.
+    """
+    parts = urlsplit(url)
+    host = parts.hostname
+    client = get_client(parts.netloc)
+    delay = RETRY_BACKOFF
+
+    for attempt in range(MAX_RETRIES + 1):
+        last_attempt = attempt == MAX_RETRIES
+
+        try:
+            async with SCHEDULER.slot(parts.netloc, priority, cost):
+                with UPSTREAM_SECONDS.time(host):
+                    response = await client.get(url, params=params, headers=headers)
+        except httpx.TransportError as e:
+            UPSTREAM_ERRORS.inc(host, type(e).__name__)
+            if last_attempt:
+                raise
+        else:
+            UPSTREAM_REQUESTS.inc(host, str(response.status_code))
+            if response.status_code >= 400:
+                UPSTREAM_ERRORS.inc(host, str(response.status_code))
+            if response.status_code == 429:
+                SCHEDULER.throttle(parts.netloc)
+            if response.status_code not in RETRY_STATUSES or last_attempt:
+                return response
+
+        await asyncio.sleep(delay)
+        delay *= 2
+
+
+async def close():
+    loop = asyncio.get_running_loop()
+
+    for host, (client, client_loop) in list(_CLIENTS.items()):
+        if client_loop is loop:
+            await client.aclose()
+        del _CLIENTS[host]
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import csv
+from pathlib import Path
+
+import numpy as np
+
+# ---------------- CONFIG ----------------
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# The original single-board history; its rows have no board column
+DEFAULT_BOARD = "default"
+DEFAULT_LABELS = BASE_DIR / "data" / "snow_day_dates.csv"
+
+# Any other closure histories: CSVs with board,date columns (or just date,
+# with the file name as the board)
+LABELS_DIR = BASE_DIR / "data" / "labels"
+
+# ----------------------------------------
+
+# Keys pack (board id, day number) into one int64
+_DAY_BITS = 20
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+class LabelStore:
+    """
+    Snow-day closures indexed by (board, date).
+
+    Single lookups hit a set. Whole columns are labelled in one pass by
+    packing each (board, date) into an int64 and searching a sorted array of
+    every closure, so labelling n rows against m closures is O(n log m)
+    however many boards there are.
+    """
+
+    def __init__(self):
+        self._board_ids = {}   # board -> small int
+        self._closures = {}    # board -> sorted unique datetime64[D]
+        self._pairs = set()    # (board, "YYYY-MM-DD")
+        self._keys = np.empty(0, dtype=np.int64)
+        self._added = []       # packed keys not yet merged into _keys
+
+    def __len__(self):
+        return len(self._pairs)
+
+    def boards(self) -> list:
+        return list(self._closures)
+
+    def add(self, board, dates):
+        days = np.unique(np.asarray(dates, dtype="datetime64[D]"))
+        board_id = self._board_ids.setdefault(board, len(self._board_ids))
+
+        self._closures[board] = np.union1d(self._closures.get(board, days[:0]), days)
+        self._pairs.update((board, str(day)) for day in days)
+
+        # Merged on the next lookup, so loading n boards sorts the keys once
+        # rather than once per board
+        self._added.append(_pack(np.full(len(days), board_id), days))
+
+    def is_closed(self, board, date) -> bool:
+        return (board, str(date)[:10]) in self._pairs
+
+    def closures(self, board) -> np.ndarray:
+        return self._closures.get(board, np.empty(0, dtype="datetime64[D]"))
+
+    def label(self, board, dates) -> np.ndarray:
+        """1 for every date the board closed, as uint8."""
+        closures = self.closures(board)
+        days = np.asarray(dates, dtype="datetime64[D]")
+        return _contains(closures, days)
+
+    def label_many(self, boards, dates) -> np.ndarray:
+        """Labels row-wise (board, date) pairs, e.g. a whole multi-region training set."""
+        boards = np.asarray(boards)
+        days = np.asarray(dates, dtype="datetime64[D]")
+
+        # Boards we have no history for get -1, which matches no key
+        names, inverse = np.unique(boards, return_inverse=True)
+        ids = np.array([self._board_ids.get(name, -1) for name in names], dtype=np.int64)[inverse]
+
+        labels = _contains(self._sorted_keys(), _pack(ids, days))
+        labels[ids < 0] = 0
+        return labels
+
+    def label_frame(self, data: pd.DataFrame, default_board=DEFAULT_BOARD) -> np.ndarray:
+        """Labels for a frame with a date column and, if it spans boards, a board column."""
+        boards = data["board"].fillna(default_board) if "board" in data else np.full(len(data), default_board)
+        return self.label_many(boards, data["date"])
+
+    def _sorted_keys(self) -> np.ndarray:
+        if self._added:
+            self._keys = np.unique(np.concatenate([self._keys, *self._added]))
+            self._added = []
+        return self._keys
+
+    @classmethod
+    def load(cls, default_labels=DEFAULT_LABELS, labels_dir=LABELS_DIR) -> "LabelStore":
+        store = cls()
+        store.add_csv(default_labels, board=DEFAULT_BOARD)
+
+        if Path(labels_dir).is_dir():
+            for path in sorted(Path(labels_dir).glob("*.csv")):
+                store.add_csv(path, board=path.stem)
+
+        return store
+
+    def add_csv(self, path, board=None):
+        # Read with the csv module: this runs at import, and pandas is kept off
+        # the startup path
+        with open(path, newline="") as f:
+            rows = [row for row in csv.DictReader(f) if row.get("date")]
+
+        dates = {}
+        for row in rows:
+            dates.setdefault(row.get("board", board), []).append(row["date"])
+        for name, days in dates.items():
+            if name:
+                self.add(name, days)
+
+
+def _pack(board_ids, days):
+    return (board_ids.astype(np.int64) << _DAY_BITS) + (days - _EPOCH).astype(np.int64)
+
+def _contains(sorted_values, values) -> np.ndarray:
+    if not len(sorted_values):
+        return np.zeros(len(values), dtype=np.uint8)
+
+    index = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return (sorted_values[index] == values).astype(np.uint8)
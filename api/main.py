@@ -1,15 +1,32 @@
+import asyncio
+import hmac
+import importlib
+import os
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, Field
 
 from datetime import datetime, timedelta
 
-import pickle
-import pandas as pd
-
+import alert_store
+import http_client
+import metrics
+import prediction_grid
+import profiler
 import weather_fetcher
 
-from explainer import GetExplanations
+from explainer import GetExplainer, GetExplanations, HasExplainer
+from feature_schema import feature_frame, feature_matrix
+from forecast_cache import grid_cell
+from metrics import PREDICTIONS, Collected, RequestTimer, stage
+from model_registry import ModelRegistry
+from single_flight import SingleFlight
+from upstream_scheduler import SCHEDULER, UpstreamBusy
+from visit_counter import VisitCounter
 
 from zoneinfo import ZoneInfo
 
@@ -19,11 +36,79 @@ from alert_fetcher import *
 # App + Paths
 # ───────────────────────────────────────────────────────────────
 
-app = FastAPI()
+# Set PREDICTION_GRID=1 to precompute the national grid for /predict. Off by
+# default: the page only calls /forecast, which is always computed live, and
+# the grid spends Open-Meteo quota whether anyone asks or not
+PREDICTION_GRID_ENABLED = os.environ.get("PREDICTION_GRID", "0") == "1"
+
+# Machines auto-stop, so cold starts reach real users, and there is one CPU.
+# By default pandas, the sklearn model, shap and the explainer load, and the
+# alert poller starts, only once the first response has gone out, so the
+# first user doesn't share the CPU with them. LAZY_STARTUP=0 does all of it
+# before serving instead
+LAZY_STARTUP = os.environ.get("LAZY_STARTUP", "1") == "1"
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.first_response = asyncio.Event()
+    if not LAZY_STARTUP:
+        await warm_up()
+        app.state.first_response.set()
+
+    tasks = [
+        asyncio.create_task(after_first_response(app, alert_store.run_poller)),
+        asyncio.create_task(MODELS.run_watcher(warm=load_explainer)),
+        asyncio.create_task(COUNTER.run_flusher()),
+    ]
+    if LAZY_STARTUP:
+        tasks.append(asyncio.create_task(after_first_response(app, warm_up)))
+    if PREDICTION_GRID_ENABLED:
+        tasks.append(asyncio.create_task(prediction_grid.run_refresher(MODELS)))
+
+    yield
+
+    for task in tasks:
+        task.cancel()
+    # Let the counter write its last flush
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await http_client.close()
+
+async def after_first_response(app, start):
+    await app.state.first_response.wait()
+    return await start()
+
+async def warm_up():
+    """Imports pandas and loads the active version's explainer, both off the event loop."""
+    await asyncio.to_thread(importlib.import_module, "pandas")
+    await load_explainer(MODELS.active)
+
+class FirstResponse:
+    """ASGI middleware that sets app.state.first_response once a response has been sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # Starlette puts itself in the scope; without a lifespan there's no event
+        first_response = getattr(scope["app"].state, "first_response", None)
+        if scope["type"] != "http" or first_response is None or first_response.is_set():
+            return await self.app(scope, receive, send)
+
+        async def send_and_mark(message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                first_response.set()
+
+        await self.app(scope, receive, send_and_mark)
+
+class TimedJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        with stage("serialization"):
+            return super().render(content)
+
+app = FastAPI(lifespan=lifespan, default_response_class=TimedJSONResponse)
 
 BASE_DIR = Path(__file__).resolve().parent
-MODEL_PATH = BASE_DIR / "model.pkl"
-COUNTER_PATH = BASE_DIR / "counter.csv"
 
 
 # ───────────────────────────────────────────────────────────────
@@ -39,15 +124,83 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so the timing covers CORS and error handling too
+app.add_middleware(RequestTimer)
+app.add_middleware(FirstResponse)
+
 # ───────────────────────────────────────────────────────────────
 # Load Model
 # ───────────────────────────────────────────────────────────────
 
-if not MODEL_PATH.exists():
-    raise RuntimeError("model.pkl not found — deployment misconfigured")
+# Versions live in models/ and the active one is memory-mapped. Publishing a
+# new version and moving the pointer swaps it in without a restart (see
+# model_registry.py). The sklearn model behind each version drags in sklearn
+# and scipy, so it's unpickled off the event loop (see load_explainer)
+MODELS = ModelRegistry(BASE_DIR / "models")
+
+try:
+    MODELS.load()
+except RuntimeError:
+    raise RuntimeError("no model in models/ — deployment misconfigured")
+
+# ───────────────────────────────────────────────────────────────
+# Upstream Coalescing
+# ───────────────────────────────────────────────────────────────
+
+FORECAST_FETCH_TIMEOUT = 30
+
+# How long a request will wait on the first crawl of an office after a cold start
+ALERT_COLD_START_WAIT = 10
+
+# Concurrent requests for the same grid cell share one upstream call
+FORECAST_FLIGHTS = SingleFlight(timeout=FORECAST_FETCH_TIMEOUT)
+
+# ...and for the same model version, one explainer load (see load_explainer)
+EXPLAINER_LOADS = SingleFlight()
 
-with open(MODEL_PATH, "rb") as f:
-    MODEL = pickle.load(f)
+# Upstream budgets are spent (see upstream_scheduler.py). Cached forecasts,
+# including stale ones, are still served; only misses end up here
+@app.exception_handler(UpstreamBusy)
+async def upstream_busy(request: Request, e: UpstreamBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Weather data is busy, try again shortly"},
+        headers={"Retry-After": str(max(1, round(e.retry_after)))},
+    )
+
+# ───────────────────────────────────────────────────────────────
+# Metrics
+# ───────────────────────────────────────────────────────────────
+
+# Stage and upstream timings are recorded where they happen (see metrics.py);
+# these are read from their owners whenever /metrics is scraped
+
+def _cache_lookups():
+    stats = weather_fetcher.FORECAST_CACHE.stats()
+    return {("hit",): stats["hits"], ("stale",): stats["stale_hits"], ("miss",): stats["misses"]}
+
+def _coalescing():
+    return {
+        (name, outcome): flights.stats()[outcome]
+        for name, flights in [("forecast", FORECAST_FLIGHTS), ("alert_crawl", alert_store.CRAWLS)]
+        for outcome in ("started", "coalesced", "timeouts")
+    }
+
+Collected("snowday_forecast_cache_lookups_total", "Forecast cache lookups by result", _cache_lookups, ["result"], kind="counter")
+Collected("snowday_forecast_cache_hit_ratio", "Share of forecast cache lookups served from the cache, stale included",
+          lambda: weather_fetcher.FORECAST_CACHE.stats()["hit_rate"])
+Collected("snowday_forecast_cache_entries", "Forecasts held in the cache", lambda: weather_fetcher.FORECAST_CACHE.stats()["size"])
+Collected("snowday_coalesced_calls_total", "Calls through each single-flight group by outcome", _coalescing, ["group", "outcome"], kind="counter")
+Collected("snowday_upstream_queue", "Upstream calls waiting for or holding a budget slot",
+          lambda: {(name, state): stats[state] for name, stats in SCHEDULER.stats().items() for state in ("queued", "in_flight")},
+          ["budget", "state"])
+Collected("snowday_upstream_scheduled_total", "Upstream budget decisions by outcome",
+          lambda: {(name, outcome): stats[outcome] for name, stats in SCHEDULER.stats().items() for outcome in ("granted", "shed", "throttled")},
+          ["budget", "outcome"], kind="counter")
+Collected("snowday_prediction_grid_cells", "Prediction grid cells covered and currently filled",
+          lambda: {(state,): prediction_grid.PREDICTION_GRID.stats()[state] for state in ("cells", "filled")}, ["state"])
+Collected("snowday_model_info", "The model version serving live predictions", lambda: {(MODELS.version,): 1}, ["version"])
+Collected("snowday_visits", "Today's visit count", lambda: COUNTER.value())
 
 # ───────────────────────────────────────────────────────────────
 # Routes
@@ -67,101 +220,246 @@ ALERT_PERCENTAGE_BUCKET = {
 }
 
 @app.get("/predict")
-async def predictions(lat: float, lon: float):
-    # Get prediction data
-    data = weather_fetcher.get_this_weeks_data(lat, lon)
-    print(lat, lon)
+async def predictions(lat: float, lon: float, response: Response):
+    # Serve from the precomputed grid when it covers this spot
+    cached = grid_predictions(lat, lon, response)
+    if cached is not None:
+        return cached
 
-    X = data.drop(columns=["date", "snow_day"], errors="ignore")
+    model = MODELS.active
+    response.headers["X-Prediction-Source"] = "live"
+    response.headers["X-Model-Version"] = model.version
+    PREDICTIONS.inc("live")
 
-    probs = MODEL.predict_proba(X)[:, 1]
+    # Get prediction data
+    data = await fetch_this_weeks_data(lat, lon)
+
+    with stage("inference"):
+        probs = model.predictor.predict_proba(feature_matrix(data))[:, 1]
     data["snow_day_probability"] = probs
 
-    results = []
-    for i, row in data.iterrows():
-        weekday = describe_day(row["date"])
-        odds = float(round(row["snow_day_probability"] * 100))
+    return format_predictions(data)
 
-        results.append({
-            "weekday": weekday,
-            "snow_day_probability": odds
-        })
-        print(results[0])
+MAX_BATCH_LOCATIONS = 1000
 
-    return results
+class Location(BaseModel):
+    lat: float
+    lon: float
 
-@app.get("/alert")
-async def alert(lat: float, lon: float):
-    main_alert = get_alert(lat, lon)
+class BatchPredictionRequest(BaseModel):
+    locations: list[Location] = Field(max_length=MAX_BATCH_LOCATIONS)
 
-    print(main_alert)
+@app.post("/predict/batch")
+async def batch_predictions(request: BatchPredictionRequest, response: Response):
+    model = MODELS.active
+    response.headers["X-Model-Version"] = model.version
 
-    main_alert["polygons"] = None
-    return main_alert
+    coords = [(location.lat, location.lon) for location in request.locations]
 
-@app.get("/explain")
-async def explain(lat: float, lon: float):
-    data = weather_fetcher.get_this_weeks_data(lat, lon)
+    # Forecasts come from the cache or multi-location upstream calls
+    frames = await weather_fetcher.get_this_weeks_data_many(coords)
 
-    X = data.drop(columns=["date", "snow_day"], errors="ignore")
-    X = X.iloc[:1]  # explain today only
+    results = [
+        {"lat": lat, "lon": lon, "predictions": None}
+        for lat, lon in coords
+    ]
 
-    all_explanations = GetExplanations(X, MODEL)
-    explanations = all_explanations[0]  # list of explanation dicts
+    available = [i for i, frame in enumerate(frames) if frame is not None and len(frame)]
+    if not available:
+        return results
 
-    results = []
+    # One feature matrix and one inference pass for every location
+    import pandas as pd
 
-    for explanation in explanations:
-        if explanation["humanized_value"] is not None:
-            results.append({
-                "reason": explanation["humanized_value"]
-            })
+    data = pd.concat([frames[i] for i in available], keys=available, names=["location", "row"])
+    with stage("inference"):
+        data["snow_day_probability"] = model.predictor.predict_proba(feature_matrix(data))[:, 1]
+
+    for i, rows in data.groupby(level="location", sort=False):
+        results[i]["predictions"] = format_predictions(rows)
 
     return results
 
+@app.get("/alert")
+async def alert(lat: float, lon: float):
+    main_alert = await get_alert(lat, lon)
+    return strip_polygons(main_alert)
 
-COUNTER = {
-    "value": 0,
-    "last_date": None,
-    "hour": None
-}
+@app.get("/explain")
+async def explain(lat: float, lon: float, response: Response):
+    model = MODELS.active
+    response.headers["X-Model-Version"] = model.version
+
+    data = await fetch_this_weeks_data(lat, lon)
+
+    return await explain_today(data, model)
+
+@app.get("/forecast")
+async def forecast(lat: float, lon: float, response: Response):
+    """
+    /predict, /explain and /alert in one response, from one forecast fetch
+    and one inference pass. The alert lookup runs alongside the fetch. When
+    the upstream budget is spent, predictions come from the grid if it can
+    answer, without explanations. Explanations are also empty until the
+    explainer has loaded after a cold start.
+    """
+    model = MODELS.active
+    response.headers["X-Model-Version"] = model.version
+
+    alert_task = asyncio.create_task(get_alert(lat, lon))
+
+    try:
+        data = await fetch_this_weeks_data(lat, lon)
+    except UpstreamBusy:
+        # Out of Open-Meteo budget: a recent grid prediction beats a 503, but
+        # there are no features to explain it with
+        predictions = grid_predictions(lat, lon, response)
+        if predictions is None:
+            alert_task.cancel()
+            raise
+
+        return {
+            "predictions": predictions,
+            "explanations": [],
+            "alert": strip_polygons(await alert_or_none(alert_task)),
+        }
+    except Exception:
+        alert_task.cancel()
+        raise
+
+    response.headers["X-Prediction-Source"] = "live"
+    PREDICTIONS.inc("live")
+
+    with stage("inference"):
+        data["snow_day_probability"] = model.predictor.predict_proba(feature_matrix(data))[:, 1]
+
+    predictions = format_predictions(data)
+
+    # Predictions don't wait on a cold explainer: until it's loaded they go
+    # out without explanations, and the page picks them up on its next refresh
+    if explainer_ready(model):
+        explanations = await explain_today(data, model)
+    else:
+        asyncio.create_task(load_explainer(model))
+        explanations = []
+
+    return {
+        "predictions": predictions,
+        "explanations": explanations,
+        "alert": strip_polygons(await alert_or_none(alert_task)),
+    }
+
+
+# Shared by every worker and saved to counter.csv; resets each day and again
+# at 7am (see visit_counter.py)
+COUNTER = VisitCounter()
 
 @app.get("/count")
 async def update_counter():
-    now = datetime.now()
-    today_str = now.strftime("%Y-%m-%d")
-    hour = now.hour
+    return COUNTER.increment()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# One profile at a time: two samplers would each count the other
+PROFILE_LOCK = asyncio.Lock()
+
+@app.get("/debug/profile", include_in_schema=False)
+async def debug_profile(
+    request: Request,
+    seconds: float = profiler.DEFAULT_SECONDS,
+    interval_ms: float = profiler.DEFAULT_INTERVAL_MS,
+    allocations: bool = False,
+    lines: bool = False,
+):
+    """
+    Samples this worker's stacks for `seconds` while it keeps serving, and
+    returns them collapsed, ready for flamegraph.pl or speedscope. With
+    `allocations`, also traces memory and returns the top allocating call sites.
+    Needs `Authorization: Bearer $DEBUG_TOKEN`; doesn't exist without DEBUG_TOKEN.
+    """
+    token = request.headers.get("authorization", "").removeprefix("Bearer ")
+    if not profiler.DEBUG_TOKEN or not hmac.compare_digest(token.encode(), profiler.DEBUG_TOKEN.encode()):
+        raise HTTPException(status_code=404)
+
+    if not 0 < seconds <= profiler.MAX_SECONDS:
+        raise HTTPException(status_code=422, detail=f"seconds must be between 0 and {profiler.MAX_SECONDS}")
+    if not 0 < interval_ms <= profiler.MAX_INTERVAL_MS:
+        raise HTTPException(status_code=422, detail=f"interval_ms must be between 0 and {profiler.MAX_INTERVAL_MS}")
+    interval_ms = max(interval_ms, profiler.MIN_INTERVAL_MS)
+
+    if PROFILE_LOCK.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    async with PROFILE_LOCK:
+        stop_tracing = profiler.start_allocations() if allocations else False
+        try:
+            stacks, ticks = await asyncio.to_thread(profiler.sample_stacks, seconds, interval_ms / 1000, lines)
+        finally:
+            top = await asyncio.to_thread(profiler.top_allocations, stop_tracing) if allocations else None
+
+    if not allocations:
+        return PlainTextResponse(profiler.collapsed(stacks))
+
+    return {
+        "pid": os.getpid(),
+        "seconds": seconds,
+        "samples": ticks,
+        "collapsed": profiler.collapsed(stacks),
+        "allocations": top,
+    }
+
+
+# ───────────────────────────────────────────────────────────────
+# Helpers
+# ───────────────────────────────────────────────────────────────
 
-    # Reset if new day
-    if COUNTER["last_date"] != today_str:
-        COUNTER["value"] = 0
-        COUNTER["last_date"] = today_str
 
-    # Reset ONCE when crossing before → after school start
-    elif COUNTER["hour"] is not None and COUNTER["hour"] < 7 and hour >= 7:
-        COUNTER["value"] = 0
+async def fetch_this_weeks_data(lat, lon):
+    try:
+        # Cache, coalescing and upstream together: what a request actually waits
+        with stage("fetch"):
+            data = await FORECAST_FLIGHTS.do(
+                grid_cell(lat, lon),
+                lambda: weather_fetcher.get_this_weeks_data(lat, lon),
+            )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Timed out waiting for the forecast")
 
-    COUNTER["hour"] = hour
-    COUNTER["value"] += 1
+    # Every waiter gets the same frame, so hand each one its own copy
+    return data.copy()
 
-    return COUNTER["value"]
+async def fetch_alerts_for_coords(lat, lon):
+    office = get_office_for_coords(lat, lon)
+    if not office:
+        return []
 
+    office_code, province = office
 
-# ───────────────────────────────────────────────────────────────
-# Helpers
-# ───────────────────────────────────────────────────────────────
+    # Until the poller has crawled this office once, join its crawl
+    if not alert_store.ALERT_STORE.has_office(office_code):
+        try:
+            await alert_store.refresh_office(office_code, province, timeout=ALERT_COLD_START_WAIT)
+        except Exception:
+            return []
 
+    with stage("polygon_match"):
+        return alert_store.ALERT_STORE.match(office_code, lat, lon)
 
-def get_alert(lat, lon):
-    alerts = get_alerts_for_coords(lat, lon)
+async def get_alert(lat, lon):
+    alerts = await fetch_alerts_for_coords(lat, lon)
 
     max_alert = None
     max_alert_value = 0
     for alert in alerts:
+        # Alerts are shared between coalesced requests, so don't mutate them
+        alert = dict(alert)
         alert_name = alert["type"]
         alert_value = ALERT_PERCENTAGE_BUCKET[alert_name]
         alert["percentage"] = alert_value
-        print(alert_name)
 
         if alert_value > max_alert_value:
             max_alert = alert
@@ -169,10 +467,98 @@ def get_alert(lat, lon):
 
     return max_alert
 
+async def alert_or_none(alert_task):
+    # Alerts are optional, so a failed lookup shouldn't cost the forecast
+    try:
+        return await alert_task
+    except Exception as e:
+        print("Alert lookup failed:", repr(e))
+        return None
+
+def strip_polygons(alert):
+    if alert:
+        alert["polygons"] = None
+    return alert
+
+def explainer_ready(model) -> bool:
+    return model.sklearn_loaded and HasExplainer(model.sklearn_model())
+
+async def load_explainer(model):
+    """
+    The version's sklearn model, with its TreeExplainer built. Unpickling and
+    building take a couple of seconds, so they run in a thread, once per
+    version however many requests are waiting, and the loop keeps serving.
+    """
+    if explainer_ready(model):
+        return model.sklearn_model()
+
+    def load():
+        sklearn_model = model.sklearn_model()
+        GetExplainer(sklearn_model)
+        return sklearn_model
+
+    return await EXPLAINER_LOADS.do(model.version, lambda: asyncio.to_thread(load))
+
+async def explain_today(data, model):
+    if data.empty:
+        return []
+
+    X = feature_frame(data.iloc[:1])  # explain today only
+    sklearn_model = await load_explainer(model)
+
+    with stage("explanation"):
+        all_explanations = GetExplanations(X, sklearn_model)
+    explanations = all_explanations[X.index[0]]  # list of explanation dicts
+
+    results = []
+
+    for explanation in explanations:
+        if explanation["humanized_value"] is not None:
+            results.append({
+                "reason": explanation["humanized_value"]
+            })
+
+    return results
+
+def grid_predictions(lat, lon, response):
+    """
+    This week's predictions for a spot from the precomputed grid, with headers
+    saying where they came from, or None if the grid can't answer for it.
+    """
+    grid = prediction_grid.PREDICTION_GRID
+    dates = weather_fetcher.this_weeks_dates()
+
+    cached = grid.lookup(lat, lon, dates)
+    if cached is None:
+        return None
+
+    probabilities, refreshed_at = cached
+    response.headers["X-Prediction-Source"] = "grid"
+    response.headers["X-Prediction-Age"] = str(int(time.time() - refreshed_at))
+    response.headers["X-Model-Version"] = grid.model_version
+    PREDICTIONS.inc("grid")
+
+    import pandas as pd
+
+    return format_predictions(pd.DataFrame({"date": dates, "snow_day_probability": probabilities}))
+
+def format_predictions(data):
+    results = []
+    for _, row in data.iterrows():
+        weekday = describe_day(row["date"])
+        odds = float(round(row["snow_day_probability"] * 100))
+
+        results.append({
+            "weekday": weekday,
+            "snow_day_probability": odds
+        })
+
+    return results
+
 def describe_day(target_date):
     now = datetime.now(ZoneInfo("America/Toronto"))
 
-    date = pd.to_datetime(target_date).date()
+    date = datetime.fromisoformat(str(target_date)[:10]).date()
     today = now.date()
 
     diff = (date - today).days
@@ -182,7 +568,7 @@ def describe_day(target_date):
     if diff == 1:
         return "Tomorrow"
 
-    return pd.Timestamp(date).day_name()
+    return date.strftime("%A")
 
 # ───────────────────────────────────────────────────────────────
 # Run App
@@ -192,4 +578,5 @@ if __name__ == "__main__":
     import uvicorn
 
     port = int(os.environ.get("PORT", 8080))
-    uvicorn.run("main:app", host="0.0.0.0", port=port)
\ No newline at end of file
+    workers = int(os.environ.get("WORKERS", 1))
+    uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers)
\ No newline at end of file
@@ -0,0 +1,193 @@
+import bisect
+import time
+from contextlib import contextmanager
+
+# ---------------- CONFIG ----------------
+
+# Seconds. Spans a cached lookup (~1 ms) up to a slow upstream call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# ----------------------------------------
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        REGISTRY.append(self)
+
+    def _label_text(self, values, extra=()):
+        pairs = list(zip(self.labels, values)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self) -> list:
+        return [f"{self.name}{self._label_text(values)} {value}" for values, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def samples(self) -> list:
+        lines = []
+        for values, series in self._series.items():
+            # Exposed cumulatively: each bucket counts everything at or below it
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{self._label_text(values, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(values)} {series[-1]}")
+            lines.append(f"{self.name}_count{self._label_text(values)} {cumulative}")
+        return lines
+
+
+class Collected(_Metric):
+    """
+    Values read from somewhere else at scrape time, like a cache's own hit
+    counters. `collect` returns {label values tuple: value}, or a bare number
+    when there are no labels.
+    """
+
+    def __init__(self, name, help, collect, labels=(), kind="gauge"):
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self.collect = collect
+
+    def samples(self) -> list:
+        try:
+            values = self.collect()
+        except Exception:
+            # A broken collector shouldn't take /metrics down with it
+            return []
+
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            f"{self.name}{self._label_text(labels)} {value}"
+            for labels, value in values.items()
+            if value is not None
+        ]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REGISTRY = []
+
+def render() -> str:
+    """Every metric in the Prometheus text format."""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# ---------------- Metrics ----------------
+
+# Metrics are per process: with several workers, each scrape sees one of them
+
+REQUEST_SECONDS = Histogram(
+    "snowday_request_seconds", "Time to handle an API request", ["route", "method", "status"],
+)
+
+STAGE_SECONDS = Histogram(
+    "snowday_stage_seconds", "Time spent in each stage of handling a request", ["stage"],
+)
+
+UPSTREAM_SECONDS = Histogram(
+    "snowday_upstream_seconds", "Time per upstream HTTP call, retries counted separately", ["host"],
+)
+
+UPSTREAM_REQUESTS = Counter(
+    "snowday_upstream_requests_total", "Upstream HTTP calls by response status", ["host", "status"],
+)
+
+UPSTREAM_ERRORS = Counter(
+    "snowday_upstream_errors_total", "Upstream calls that failed: transport errors and 4xx/5xx responses", ["host", "error"],
+)
+
+ALERT_CRAWL = Counter(
+    "snowday_alert_crawl_total", "Datamart work done by alert crawls", ["office", "item"],
+)
+
+PREDICTIONS = Counter(
+    "snowday_predictions_total", "/predict and /forecast answers by where they came from", ["source"],
+)
+
+
+def stage(name):
+    """Times the block as one stage of a request, e.g. `with stage("inference"):`."""
+    return STAGE_SECONDS.time(name)
+
+
+class RequestTimer:
+    """
+    ASGI middleware recording every request in REQUEST_SECONDS, labelled by
+    route template rather than raw path so the number of series stays fixed.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router puts the matched route in the scope
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                route.path if route is not None else "unmatched",
+                scope["method"],
+                str(status),
+            )
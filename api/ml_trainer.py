@@ -1,11 +1,17 @@
+import asyncio
+import math
+import time
+import warnings
 import pandas as pd
 import numpy as np
-import pickle
 import weather_fetcher as weather
 
+from feature_schema import FEATURE_NAMES, Dataset, feature_frame
+from model_registry import ModelRegistry, publish
+
 from explainer import GetExplanations
 
-from sklearn.model_selection import train_test_split, GridSearchCV
+from sklearn.model_selection import train_test_split, GridSearchCV, ParameterGrid, StratifiedKFold
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, confusion_matrix, recall_score, precision_score
 
@@ -16,30 +22,74 @@ SEED = 42
 TEST_SIZE = 0.3
 THRESHOLD = 0.35  # <---- KEY CHANGE (was implicitly 0.5 before)
 
+PARAM_GRID = {
+    "n_estimators": [100, 300, 500],
+    "max_depth": [None, 6, 10, 15],
+    "min_samples_split": [2, 5, 10],
+    # removed class_weight from grid → we force balanced
+}
+CV_FOLDS = 5
+
+# "halving" or "grid" (the exhaustive GridSearchCV)
+SEARCH = "halving"
+HALVING_FACTOR = 3  # keep the best 1/3 of candidates at every step
+
 
 # ----------------------------------------
 
-def Train(data):
+def Train(data, search=SEARCH):
     global MODEL
 
-    x = data.drop(columns=["date", "snow_day"])
-    y = data["snow_day"]
+    x_train, x_test, y_train, y_test = SplitData(data)
+
+    if search == "halving":
+        MODEL, best_params, best_recall = HalvingSearch(x_train, y_train)
+    else:
+        MODEL, best_params, best_recall = GridSearch(x_train, y_train)
+
+    # Running APIs pick the new version up from the registry pointer
+    version = publish(MODEL, metadata={"params": best_params, "search": search, "cv_recall": best_recall})
+    print("PUBLISHED MODEL VERSION:", version)
+
+    print("BEST MODEL SETTINGS:")
+    print(best_params)
+    print()
+
+    # ---------------- EVALUATION ----------------
+
+    probs = MODEL.predict_proba(x_test)[:, 1]
+    y_pred = (probs >= THRESHOLD).astype(int)
 
-    x_train, x_test, y_train, y_test = train_test_split(
+    print("Accuracy:", accuracy_score(y_test, y_pred))
+    print("Snow Day Recall:", recall_score(y_test, y_pred))
+    print("Snow Day Precision:", precision_score(y_test, y_pred))
+    print()
+
+    cm = confusion_matrix(y_test, y_pred)
+    tn, fp, fn, tp = cm.ravel()
+
+    print(f"Predicted {tn}/{tn + fp} non-snow days")
+    print(f"Predicted {tp}/{tp + fn} snow days")
+    print()
+
+
+def SplitData(data):
+    # A DataFrame (e.g. a training CSV) or a Dataset from read_dataset
+    dataset = data if isinstance(data, Dataset) else Dataset.from_frame(data)
+
+    x = dataset.frame()
+    y = dataset.labels()
+
+    return train_test_split(
         x, y,
         test_size=TEST_SIZE,
         random_state=SEED,
         stratify=y,
     )
 
-    # 🔍 GRID SEARCH
-    param_grid = {
-        "n_estimators": [100, 300, 500],
-        "max_depth": [None, 6, 10, 15],
-        "min_samples_split": [2, 5, 10],
-        # removed class_weight from grid → we force balanced
-    }
 
+def GridSearch(x_train, y_train):
+    """Every combination in PARAM_GRID, each forest fit from scratch on every fold."""
     base_model = RandomForestClassifier(
         random_state=SEED,
         class_weight="balanced"
@@ -47,47 +97,109 @@ def Train(data):
 
     grid = GridSearchCV(
         base_model,
-        param_grid,
-        cv=5,
+        PARAM_GRID,
+        cv=CV_FOLDS,
         scoring="recall",  # snow days matter most
         n_jobs=-1
     )
 
     grid.fit(x_train, y_train)
 
-    MODEL = grid.best_estimator_
+    return grid.best_estimator_, grid.best_params_, float(grid.best_score_)
 
-    with open("model.pkl", "wb") as f:
-        pickle.dump(MODEL, f)
 
-    print("BEST MODEL SETTINGS:")
-    print(grid.best_params_)
-    print()
+def HalvingSearch(x_train, y_train):
+    """
+    Successive halving over PARAM_GRID, with n_estimators as the budget.
 
-    # ---------------- EVALUATION ----------------
+    Every other combination starts with the fewest trees on every fold. After
+    each step only the best 1/HALVING_FACTOR by mean recall go on, and their
+    forests are grown to the next size with warm_start rather than refit.
+    sklearn seeds added trees as if the forest had been fit in one go, so a
+    grown forest is identical to a fresh one of that size.
 
-    probs = MODEL.predict_proba(x_test)[:, 1]
-    y_pred = (probs >= THRESHOLD).astype(int)
+    Folds match GridSearchCV's, so recalls are directly comparable.
+    """
+    sizes = sorted(PARAM_GRID["n_estimators"])
+    candidates = list(ParameterGrid({k: v for k, v in PARAM_GRID.items() if k != "n_estimators"}))
+    folds = list(StratifiedKFold(CV_FOLDS).split(x_train, y_train))
 
-    print("Accuracy:", accuracy_score(y_test, y_pred))
-    print("Snow Day Recall:", recall_score(y_test, y_pred))
-    print("Snow Day Precision:", precision_score(y_test, y_pred))
-    print()
+    # Ties go to the combination GridSearchCV would have listed first
+    grid_order = list(ParameterGrid(PARAM_GRID))
 
-    cm = confusion_matrix(y_test, y_pred)
-    tn, fp, fn, tp = cm.ravel()
+    forests = {
+        i: [
+            RandomForestClassifier(random_state=SEED, class_weight="balanced", warm_start=True, n_jobs=-1, **params)
+            for _ in folds
+        ]
+        for i, params in enumerate(candidates)
+    }
 
-    print(f"Predicted {tn}/{tn + fp} non-snow days")
-    print(f"Predicted {tp}/{tp + fn} snow days")
-    print()
+    alive = list(range(len(candidates)))
+    results = []  # (mean recall, params)
+
+    with warnings.catch_warnings():
+        # Each forest only ever sees its own fold, so the class weights it
+        # computed on the first fit stay right as it grows
+        warnings.filterwarnings("ignore", message="class_weight presets", category=UserWarning)
+
+        for step, n_estimators in enumerate(sizes):
+            scores = {}
+
+            for i in alive:
+                recalls = []
+                for forest, (train, test) in zip(forests[i], folds):
+                    forest.set_params(n_estimators=n_estimators)
+                    forest.fit(x_train.iloc[train], y_train.iloc[train])
+                    recalls.append(recall_score(y_train.iloc[test], forest.predict(x_train.iloc[test])))
+
+                scores[i] = float(np.mean(recalls))
+                results.append((scores[i], {**candidates[i], "n_estimators": n_estimators}))
+
+            print(f"  {n_estimators} trees: {len(alive)} candidates, best recall {max(scores.values()):.3f}")
+
+            if step < len(sizes) - 1:
+                keep = max(1, math.ceil(len(alive) / HALVING_FACTOR))
+                alive = sorted(alive, key=lambda i: -scores[i])[:keep]
+
+                # Dropped candidates' forests are no longer needed
+                for i in list(forests):
+                    if i not in alive:
+                        del forests[i]
+
+    best_recall, best_params = min(results, key=lambda r: (-r[0], grid_order.index(r[1])))
+
+    # Refit on the whole training split, as GridSearchCV does
+    model = RandomForestClassifier(random_state=SEED, class_weight="balanced", **best_params)
+    model.fit(x_train, y_train)
+
+    return model, best_params, best_recall
+
+
+def CompareSearches(data):
+    """Wall time, CV recall and held-out recall of both searches on the same split."""
+    x_train, x_test, y_train, y_test = SplitData(data)
+
+    print(f"{len(x_train)} training rows, {len(ParameterGrid(PARAM_GRID))} combinations, {CV_FOLDS} folds\n")
+
+    for name, search in [("grid", GridSearch), ("halving", HalvingSearch)]:
+        start = time.perf_counter()
+        model, best_params, best_recall = search(x_train, y_train)
+        elapsed = time.perf_counter() - start
+
+        y_pred = (model.predict_proba(x_test)[:, 1] >= THRESHOLD).astype(int)
+
+        print(
+            f"{name:<8} {elapsed:>7.1f}s   cv recall {best_recall:.3f}   "
+            f"test recall {recall_score(y_test, y_pred):.3f}   {best_params}\n"
+        )
 
 
 def PrintFeatureImportance():
     importances = MODEL.feature_importances_
 
-    features = TRAINING_DATA.drop(columns=["date", "snow_day"]).columns
     importance_df = pd.DataFrame({
-        "feature": features,
+        "feature": FEATURE_NAMES,
         "importance": importances
     }).sort_values(by="importance", ascending=False)
 
@@ -97,10 +209,9 @@ def PrintFeatureImportance():
 
 
 def Test(data):
-    X = data.drop(columns=["date", "snow_day"])
+    X = feature_frame(data)
 
-    with open("../api/model.pkl", "rb") as f:
-        MODEL = pickle.load(f)
+    MODEL = ModelRegistry().load().sklearn_model()
 
     all_explanations = GetExplanations(X, MODEL)
 
@@ -124,6 +235,7 @@ def Test(data):
         explanation_list = [
             {"explanation": explanation["humanized_value"] + ("+" if explanation["direction"] == "up" else "-")}
             for explanation in explanations
+            if explanation["humanized_value"] is not None
         ]
 
         print("  Top factors:")
@@ -131,10 +243,9 @@ def Test(data):
         print()
 
 def add_predictions(data):
-    X = data.drop(columns=["date", "snow_day"])
+    X = feature_frame(data)
 
-    with open("../api/model.pkl", "rb") as f:
-        MODEL = pickle.load(f)
+    MODEL = ModelRegistry().load().sklearn_model()
 
     probs = MODEL.predict_proba(X)[:, 1]
 
@@ -145,13 +256,15 @@ def add_predictions(data):
 # ---------------- RUN ----------------
 
 #TRAINING_DATA = pd.read_csv("data/training_dataset_6.csv")
+#TRAINING_DATA = read_dataset("data/training_dataset_canada.npz")
 
 
-TESTING_DATA = weather.get_this_weeks_data()
+TESTING_DATA = asyncio.run(weather.get_this_weeks_data())
 
 #add_predictions(TRAINING_DATA)
 
 #Train(TRAINING_DATA)
+#CompareSearches(TRAINING_DATA)
 #PrintFeatureImportance()
 
 Test(TESTING_DATA)
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import os
+import pickle
+import time
+from pathlib import Path
+
+import numpy as np
+
+from feature_schema import check_feature_names
+from forest_engine import FlatForest, export_forest
+
+# ---------------- CONFIG ----------------
+
+REGISTRY_DIR = Path(__file__).resolve().parent / "models"
+
+# File naming the active version. Replaced atomically, never edited in place
+POINTER = "CURRENT"
+MANIFEST = "manifest.json"
+SKLEARN_MODEL = "model.pkl"
+
+FORMAT = "flat-forest/1"
+
+# Node arrays stored one .npy file each, so they can be memory-mapped
+ARRAYS = ["feature", "threshold", "left", "right", "missing_left", "value", "children", "roots"]
+
+# How often running workers check the pointer for a new version
+POLL_SECONDS = 30
+
+# ----------------------------------------
+
+
+class ModelVersion:
+    """
+    One published model: the flat forest used for predictions, mapped
+    read-only from its .npy files so every worker shares the same pages, and
+    the sklearn model behind it, unpickled only when explanations need it.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.manifest = json.loads((path / MANIFEST).read_text())
+        self.version = self.manifest["version"]
+
+        # Serving builds features in schema order, so the model has to agree
+        check_feature_names(self.manifest["feature_names"])
+
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in ARRAYS}
+        arrays["max_depth"] = self.manifest["max_depth"]
+        arrays["feature_names"] = np.asarray(self.manifest["feature_names"], dtype=str)
+        self.predictor = FlatForest(arrays)
+
+        self._sklearn_model = None
+
+    @property
+    def sklearn_loaded(self) -> bool:
+        return self._sklearn_model is not None
+
+    def sklearn_model(self):
+        if self._sklearn_model is None:
+            with open(self.path / SKLEARN_MODEL, "rb") as f:
+                self._sklearn_model = pickle.load(f)
+        return self._sklearn_model
+
+
+class ModelRegistry:
+    """
+    Versioned models under one directory, plus the version currently serving.
+
+    Requests take `registry.active` once and use that ModelVersion to the end,
+    so swapping in a new version never disturbs a request already in flight.
+    """
+
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = Path(root)
+        self.active = None
+
+    @property
+    def version(self):
+        return self.active.version if self.active else None
+
+    def versions(self) -> list:
+        return sorted(path.name for path in self.root.iterdir() if (path / MANIFEST).exists())
+
+    def current(self):
+        """The version the pointer names, or None if nothing was published yet."""
+        try:
+            return (self.root / POINTER).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def load(self) -> ModelVersion:
+        version = self.current()
+        if version is None:
+            raise RuntimeError(f"no model published in {self.root}")
+
+        self.active = ModelVersion(self.root / version)
+        return self.active
+
+    def reload(self) -> bool:
+        """Switches to the version the pointer names, if it changed. Returns True if it did."""
+        version = self.current()
+        if version is None or version == self.version:
+            return False
+
+        # Build the new version completely before it becomes visible
+        self.active = ModelVersion(self.root / version)
+        print("Model version now", version)
+        return True
+
+    async def run_watcher(self, interval: float = POLL_SECONDS, warm=None):
+        """Polls the pointer. `warm(version)` is awaited after each swap, e.g. to load caches for it."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                swapped = self.reload()
+            except Exception as e:
+                # Keep serving the version already loaded
+                print("Model reload failed:", repr(e))
+                continue
+
+            if swapped and warm is not None:
+                try:
+                    await warm(self.active)
+                except Exception as e:
+                    print("Model warmup failed:", repr(e))
+
+
+def publish(model, root=REGISTRY_DIR, version=None, metadata=None, activate=True) -> str:
+    """
+    Writes a fitted RandomForestClassifier as a new version and, by default,
+    points the registry at it. Returns the version name.
+    """
+    check_feature_names(model.feature_names_in_)
+
+    root = Path(root)
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    path = root / version
+    path.mkdir(parents=True, exist_ok=False)
+
+    arrays = export_forest(model)
+    for name in ARRAYS:
+        np.save(path / f"{name}.npy", arrays[name])
+
+    with open(path / SKLEARN_MODEL, "wb") as f:
+        pickle.dump(model, f)
+
+    manifest = {
+        "version": version,
+        "format": FORMAT,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "n_estimators": len(arrays["roots"]),
+        "node_count": len(arrays["value"]),
+        "max_depth": int(arrays["max_depth"]),
+        "feature_names": arrays["feature_names"].tolist(),
+        "arrays": {name: {"dtype": str(arrays[name].dtype), "shape": list(arrays[name].shape)} for name in ARRAYS},
+        **(metadata or {}),
+    }
+
+    # The manifest goes last: a version without one is never picked up
+    _write_atomic(path / MANIFEST, json.dumps(manifest, indent=2))
+
+    if activate:
+        activate_version(version, root)
+
+    return version
+
+
+def activate_version(version, root=REGISTRY_DIR):
+    root = Path(root)
+    if not (root / version / MANIFEST).exists():
+        raise ValueError(f"unknown model version {version!r}")
+
+    _write_atomic(root / POINTER, version + "\n")
+
+
+def _write_atomic(path: Path, text):
+    # os.replace is atomic, so readers see the old file or the new one, never half of either
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+if __name__ == "__main__":
+    import sys
+
+    usage = "usage: python model_registry.py publish <model.pkl> [version] | activate <version> | list"
+    if len(sys.argv) < 2:
+        sys.exit(usage)
+
+    command = sys.argv[1]
+    registry = ModelRegistry()
+
+    if command == "publish" and len(sys.argv) >= 3:
+        with open(sys.argv[2], "rb") as f:
+            model = pickle.load(f)
+        print("Published", publish(model, version=sys.argv[3] if len(sys.argv) > 3 else None))
+    elif command == "activate" and len(sys.argv) == 3:
+        activate_version(sys.argv[2])
+        print("Activated", sys.argv[2])
+    elif command == "list":
+        current = registry.current()
+        for version in registry.versions():
+            print(("* " if version == current else "  ") + version)
+    else:
+        sys.exit(usage)
@@ -0,0 +1,238 @@
+import asyncio
+import time
+
+import numpy as np
+import shapely
+
+import weather_fetcher
+from alert_fetcher import PROVINCE_POLYGONS
+from feature_schema import feature_matrix
+from upstream_scheduler import BACKGROUND, priority
+
+# ---------------- CONFIG ----------------
+
+GRID_STEP = 0.5  # degrees, ~50 km
+
+# Populated Canada: the provincial boxes, south of the sparse north
+GRID_MIN_LAT = 41.5
+GRID_MAX_LAT = 56.0
+GRID_MIN_LON = -139.0
+GRID_MAX_LON = -52.0
+
+# Only cells within POPULATED_RADIUS of one of these (lat, lon) are covered.
+# Census metropolitan areas and the larger towns between them, plus Owen Sound
+POPULATED_PLACES = [
+    (43.65, -79.38), (45.50, -73.57), (49.28, -123.12), (51.05, -114.07), (53.55, -113.49),
+    (45.42, -75.69), (49.90, -97.14), (46.81, -71.21), (43.26, -79.87), (43.45, -80.49),
+    (42.98, -81.25), (44.65, -63.57), (48.43, -123.37), (42.31, -83.04), (52.13, -106.67),
+    (50.45, -104.61), (45.40, -71.89), (47.56, -52.71), (44.39, -79.69), (49.89, -119.50),
+    (49.05, -122.33), (46.49, -80.99), (44.23, -76.49), (48.43, -71.07), (46.35, -72.55),
+    (46.09, -64.78), (45.27, -66.06), (48.38, -89.25), (44.30, -78.32), (49.69, -112.84),
+    (49.17, -123.94), (50.67, -120.33), (45.96, -66.64), (46.24, -63.13), (52.27, -113.81),
+    (46.52, -84.35), (53.92, -122.75), (46.31, -79.46), (44.57, -80.94), (48.45, -68.52),
+    (48.48, -81.33), (49.85, -99.95),
+]
+POPULATED_RADIUS = 1.0  # degrees of latitude, ~110 km
+
+# Open-Meteo bills every location in a request, against 10,000 a day. About
+# 560 cells four times a day is ~2,250, plus one extra pass per new school
+# week or model version, which leaves most of the day's quota to users
+REFRESH_SECONDS = 6 * 60 * 60
+
+# Cells older than this are ignored and /predict computes on demand instead
+MAX_AGE_SECONDS = 2 * REFRESH_SECONDS
+
+# How often the refresher checks whether the school week has rolled over
+CHECK_SECONDS = 60
+
+# Cells fetched and scored per pass: one upstream call's worth, so the
+# event loop is never busy building features for long
+CELLS_PER_PASS = weather_fetcher.MAX_LOCATIONS_PER_REQUEST
+
+DAYS = 5
+
+# ----------------------------------------
+
+
+class PredictionGrid:
+    """
+    Snow-day probabilities for the next 5 school days on a fixed lat/lon grid.
+
+    Everything lives in flat float32 arrays indexed by (row, col), so a lookup
+    is a couple of index calculations no matter how big the grid is.
+    """
+
+    def __init__(self, step=GRID_STEP, min_lat=GRID_MIN_LAT, max_lat=GRID_MAX_LAT, min_lon=GRID_MIN_LON, max_lon=GRID_MAX_LON,
+                 populated_places=POPULATED_PLACES, populated_radius=POPULATED_RADIUS):
+        self.step = step
+        self.lats = np.arange(min_lat, max_lat + step / 2, step, dtype=np.float32)
+        self.lons = np.arange(min_lon, max_lon + step / 2, step, dtype=np.float32)
+
+        shape = (len(self.lats), len(self.lons))
+
+        lon_grid, lat_grid = np.meshgrid(self.lons, self.lats)
+        in_province = np.zeros(shape, dtype=bool)
+        for polygon in PROVINCE_POLYGONS.values():
+            in_province |= shapely.contains_xy(polygon, lon_grid, lat_grid)
+
+        # Longitude degrees shrink towards the pole, so scale them to match latitude's
+        populated = np.zeros(shape, dtype=bool)
+        for lat, lon in populated_places:
+            populated |= (lat_grid - lat) ** 2 + ((lon_grid - lon) * np.cos(np.radians(lat))) ** 2 <= populated_radius ** 2
+
+        self.covered = in_province & populated
+
+        self.probabilities = np.full(shape + (DAYS,), np.nan, dtype=np.float32)
+        self.refreshed_at = np.zeros(shape, dtype=np.float64)
+        self.dates = None
+        self.model_version = None
+
+        self.last_refresh_started = None
+        self.last_refresh_seconds = None
+        self.last_refresh_cells = 0
+
+    def cells(self) -> list:
+        """(row, col) of every covered cell."""
+        return list(zip(*np.nonzero(self.covered)))
+
+    def store(self, rows, cols, probabilities, refreshed_at):
+        self.probabilities[rows, cols] = probabilities
+        self.refreshed_at[rows, cols] = refreshed_at
+
+    def lookup(self, lat, lon, dates, interpolate=True, now=None):
+        """
+        Returns (probabilities for each date, refreshed_at) for the cell(s)
+        around a coordinate, or None if the grid can't answer for these dates.
+        """
+        if self.dates != dates:
+            return None
+
+        now = now or time.time()
+
+        row = (lat - self.lats[0]) / self.step
+        col = (lon - self.lons[0]) / self.step
+
+        if interpolate:
+            result = self._interpolate(row, col, now)
+            if result is not None:
+                return result
+
+        return self._cell(int(round(row)), int(round(col)), now)
+
+    def _cell(self, row, col, now):
+        if not (0 <= row < len(self.lats) and 0 <= col < len(self.lons)):
+            return None
+        if not self._fresh(row, col, now):
+            return None
+        return self.probabilities[row, col], self.refreshed_at[row, col]
+
+    def _interpolate(self, row, col, now):
+        """Bilinear blend of the four surrounding cells, if all of them are fresh."""
+        row0, col0 = int(np.floor(row)), int(np.floor(col))
+        if not (0 <= row0 < len(self.lats) - 1 and 0 <= col0 < len(self.lons) - 1):
+            return None
+
+        corners = [(row0, col0), (row0, col0 + 1), (row0 + 1, col0), (row0 + 1, col0 + 1)]
+        if not all(self._fresh(r, c, now) for r, c in corners):
+            return None
+
+        dr, dc = row - row0, col - col0
+        weights = [(1 - dr) * (1 - dc), (1 - dr) * dc, dr * (1 - dc), dr * dc]
+
+        probabilities = sum(w * self.probabilities[r, c] for w, (r, c) in zip(weights, corners))
+        refreshed_at = min(self.refreshed_at[r, c] for r, c in corners)
+        return probabilities, refreshed_at
+
+    def _fresh(self, row, col, now):
+        return (
+            self.refreshed_at[row, col] > 0
+            and now - self.refreshed_at[row, col] < MAX_AGE_SECONDS
+            and not np.isnan(self.probabilities[row, col, 0])
+        )
+
+    def stats(self) -> dict:
+        filled = self.refreshed_at > 0
+        return {
+            "cells": int(self.covered.sum()),
+            "filled": int(filled.sum()),
+            "dates": self.dates,
+            "model_version": self.model_version,
+            "oldest_cell_age_seconds": float(time.time() - self.refreshed_at[filled].min()) if filled.any() else None,
+            "last_refresh_started": self.last_refresh_started,
+            "last_refresh_seconds": self.last_refresh_seconds,
+            "last_refresh_cells": self.last_refresh_cells,
+            "nbytes": self.probabilities.nbytes + self.refreshed_at.nbytes,
+        }
+
+
+PREDICTION_GRID = PredictionGrid()
+
+
+async def refresh_grid(grid: PredictionGrid, models):
+    """Fetches and scores every covered cell, CELLS_PER_PASS at a time."""
+    import pandas as pd
+
+    started = time.time()
+    dates = weather_fetcher.this_weeks_dates()
+
+    # One version scores the whole pass, even if a new one is swapped in meanwhile
+    model = models.active
+
+    # A new school week or a new model invalidates every cell at once, so
+    # the grid never mixes answers from two of them
+    if grid.dates != dates or grid.model_version != model.version:
+        grid.probabilities[:] = np.nan
+        grid.refreshed_at[:] = 0
+        grid.dates = dates
+        grid.model_version = model.version
+
+    cells = grid.cells()
+    scored = 0
+
+    for start in range(0, len(cells), CELLS_PER_PASS):
+        batch = cells[start:start + CELLS_PER_PASS]
+        coords = [(float(grid.lats[row]), float(grid.lons[col])) for row, col in batch]
+
+        frames = await weather_fetcher.get_this_weeks_data_many(coords, dates=dates, use_cache=False)
+
+        available = [i for i, frame in enumerate(frames) if frame is not None and len(frame) == DAYS]
+        if not available:
+            continue
+
+        # One feature matrix and one inference pass per batch of cells
+        data = pd.concat([frames[i] for i in available], ignore_index=True)
+        X = feature_matrix(data)
+        probabilities = (await asyncio.to_thread(model.predictor.predict_proba, X))[:, 1].reshape(len(available), DAYS)
+
+        rows = np.array([batch[i][0] for i in available])
+        cols = np.array([batch[i][1] for i in available])
+        grid.store(rows, cols, probabilities, time.time())
+        scored += len(available)
+
+    grid.last_refresh_started = started
+    grid.last_refresh_seconds = time.time() - started
+    grid.last_refresh_cells = scored
+
+    print(f"Prediction grid refreshed: {scored}/{len(cells)} cells in {grid.last_refresh_seconds:.1f}s")
+
+
+async def run_refresher(models, grid: PredictionGrid = PREDICTION_GRID, interval: float = REFRESH_SECONDS):
+    last_refresh = 0
+
+    # Refreshes only spend Open-Meteo calls users aren't waiting for
+    with priority(BACKGROUND):
+        while True:
+            # Refresh on schedule, and straight away once the 7am cutoff moves the
+            # week or a new model version is swapped in
+            if (
+                time.time() - last_refresh >= interval
+                or grid.dates != weather_fetcher.this_weeks_dates()
+                or grid.model_version != models.version
+            ):
+                last_refresh = time.time()
+                try:
+                    await refresh_grid(grid, models)
+                except Exception as e:
+                    print("Prediction grid refresh failed:", repr(e))
+
+            await asyncio.sleep(CHECK_SECONDS)
@@ -0,0 +1,101 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# ---------------- CONFIG ----------------
+
+# /debug/profile is only served when this is set (fly secrets set DEBUG_TOKEN=...)
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN")
+
+DEFAULT_SECONDS = 10
+MAX_SECONDS = 60
+
+# 100 Hz costs well under 1% of a core, and a few seconds of it is plenty
+DEFAULT_INTERVAL_MS = 10
+MIN_INTERVAL_MS = 1
+MAX_INTERVAL_MS = 1000
+
+# Allocation snapshots: frames kept per allocation, and how many sites to report
+ALLOCATION_FRAMES = 10
+TOP_ALLOCATIONS = 25
+
+# ----------------------------------------
+
+
+def _label(frame, lines: bool) -> str:
+    code = frame.f_code
+    label = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+    return f"{label}:{frame.f_lineno}" if lines else label
+
+
+def sample_stacks(seconds: float, interval: float, lines: bool = False) -> tuple:
+    """
+    Samples every other thread's stack each `interval` seconds, for `seconds`.
+    Returns (Counter of collapsed stacks, number of ticks). Meant to run in a
+    thread of its own, so the event loop it's watching keeps serving.
+    """
+    me = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    stacks = Counter()
+    ticks = 0
+
+    deadline = time.monotonic() + seconds
+    next_tick = time.monotonic()
+
+    while next_tick < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+
+            labels = []
+            while frame is not None:
+                labels.append(_label(frame, lines))
+                frame = frame.f_back
+
+            # Root first, thread name as the root, the way flame graph tools expect
+            labels.append(names.get(ident, f"thread-{ident}"))
+            stacks[";".join(reversed(labels))] += 1
+
+        ticks += 1
+        next_tick += interval
+        time.sleep(max(0.0, next_tick - time.monotonic()))
+
+    return stacks, ticks
+
+
+def collapsed(stacks: Counter) -> str:
+    """Brendan Gregg's collapsed format, one "frame;frame;frame count" line per stack."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def start_allocations() -> bool:
+    """Starts tracing allocations. Returns False if something else already was."""
+    if tracemalloc.is_tracing():
+        return False
+    tracemalloc.start(ALLOCATION_FRAMES)
+    return True
+
+
+def top_allocations(stop: bool, limit: int = TOP_ALLOCATIONS) -> list:
+    """Call sites holding the most memory allocated since tracing started."""
+    snapshot = tracemalloc.take_snapshot()
+    if stop:
+        tracemalloc.stop()
+
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+
+    return [
+        {
+            "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_kb": round(stat.size / 1024, 1),
+            "count": stat.count,
+            "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+        }
+        for stat in snapshot.statistics("traceback")[:limit]
+    ]
@@ -0,0 +1,74 @@
+import asyncio
+
+
+class _Call:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one in-flight operation.
+
+    The first caller for a key starts the operation; everyone who arrives
+    while it is still running waits on the same task and gets the same
+    result (or exception). Each waiter has its own timeout, and a waiter
+    timing out never cancels the operation for the others.
+    """
+
+    def __init__(self, timeout: float = None):
+        self.timeout = timeout
+        self._calls = {}
+
+        self.started = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    async def do(self, key, fn, timeout: float = None):
+        """Runs `await fn()` once per key at a time and shares its result."""
+        call = self._calls.get(key)
+
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.started += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(call.task),
+                timeout if timeout is not None else self.timeout,
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+        # Mark the exception as retrieved even if every waiter timed out
+        if not call.task.cancelled():
+            call.task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def waiters(self, key) -> int:
+        call = self._calls.get(key)
+        return call.waiters if call else 0
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "waiters": sum(call.waiters for call in self._calls.values()),
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+        }
@@ -0,0 +1,50 @@
+"""
+The vectorized feature builder must give exactly what the per-day reference
+builder gives, including on the responses that send it down the fallback path.
+
+    cd api && python -m pytest tests
+"""
+from datetime import datetime
+
+import pandas as pd
+
+import weather_fetcher
+from benchmarks.fixtures import open_meteo_response
+from feature_engine import build_features
+from label_store import DEFAULT_BOARD
+
+# A week with closures in it, so the snow_day column is exercised too
+START, END = "2024-12-02", "2024-12-08"
+
+
+def _both(data, start=START, end=END):
+    start_dt, end_dt = datetime.fromisoformat(start), datetime.fromisoformat(end)
+    by_day = weather_fetcher.build_rows_by_day(data["hourly"], data["daily"], start_dt, end_dt)
+    vectorized = build_features(data["hourly"], data["daily"], start_dt, end_dt, weather_fetcher.LABELS.closures(DEFAULT_BOARD))
+    return by_day, vectorized
+
+
+def test_matches_per_day_builder():
+    by_day, vectorized = _both(open_meteo_response(START, END, missing=0.0))
+
+    assert vectorized["snow_day"].any()
+    pd.testing.assert_frame_equal(by_day, vectorized)
+
+
+def test_matches_per_day_builder_with_missing_values():
+    by_day, vectorized = _both(open_meteo_response(START, END, missing=0.2))
+    pd.testing.assert_frame_equal(by_day, vectorized)
+
+
+def test_partial_days_fall_back_to_per_day_builder():
+    # The day after the range arrives cut off, so the hours don't split into whole days
+    whole = open_meteo_response(START, "2024-12-09")
+    cut = {**whole, "hourly": {key: values[:-5] for key, values in whole["hourly"].items()}}
+
+    start_dt, end_dt = datetime.fromisoformat(START), datetime.fromisoformat(END)
+    assert build_features(cut["hourly"], cut["daily"], start_dt, end_dt) is None
+
+    # Same rows as the vectorized path gives for the whole response
+    fallback = weather_fetcher.features_from_response(cut, start_dt, end_dt)
+    _, vectorized = _both(whole)
+    pd.testing.assert_frame_equal(fallback, vectorized)
@@ -1,3 +1,4 @@
+import asyncio
 import weather_fetcher as weather
 import pandas as pd
 
@@ -28,12 +29,12 @@ if choice in ["y", ""]:
 
         print(f"Fetching {start} → {end}")
 
-        year_data = weather.get_data_within_timerange(
+        year_data = asyncio.run(weather.get_data_within_timerange(
             start,
             end,
             latitude,
             longitude
-        )
+        ))
 
         all_data.append(year_data)
 
@@ -0,0 +1,241 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlsplit
+
+# ---------------- CONFIG ----------------
+
+# Lower runs first. Users waiting on a page beat background refreshes, which
+# beat bulk jobs like backfills
+INTERACTIVE = 0
+BACKGROUND = 1
+BULK = 2
+
+# Share of every bucket a priority has to leave untouched, so background
+# work can never spend the last of the budget a user request needs
+RESERVE = {INTERACTIVE: 0.0, BACKGROUND: 0.2, BULK: 0.5}
+
+# How long a request may queue before it's shed (None waits as long as it takes)
+MAX_WAIT = {INTERACTIVE: 2.0, BACKGROUND: None, BULK: None}
+
+# Budgets as (calls, per seconds) token buckets, all of which must have
+# enough tokens, plus how many calls may be in flight at once. A request costs
+# what the upstream bills for it: Open-Meteo counts every location, and long
+# date spans as several calls (see weather_fetcher.call_cost). Kept below its
+# free-tier limits of 600/minute, 5,000/hour and 10,000/day, which the
+# forecast and archive hosts count together. Budgets are per process, so
+# scale them down if running more than one worker
+BUDGETS = {
+    "open-meteo": {
+        "buckets": [(500, 60), (4000, 60 * 60), (8000, 24 * 60 * 60)],
+        "concurrency": 16,
+    },
+    # Datamart publishes no limit; this keeps a full crawl polite
+    "datamart": {
+        "buckets": [(20, 1), (600, 60)],
+        "concurrency": 8,
+    },
+}
+
+# Keyed by host, plus the port if it isn't the scheme's default. The fetchers
+# also route whatever URLs they're configured with (see UpstreamScheduler.route),
+# so a mirror or the load test's local stand-ins are charged the same budgets
+HOST_BUDGETS = {
+    "api.open-meteo.com": "open-meteo",
+    "archive-api.open-meteo.com": "open-meteo",
+    "dd.weather.gc.ca": "datamart",
+}
+
+# ----------------------------------------
+
+# Priority for calls that don't pass one, set by background entry points
+_PRIORITY = contextvars.ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+class UpstreamBusy(Exception):
+    """The upstream's budget is spent for now; retry after `retry_after` seconds."""
+
+    def __init__(self, budget, retry_after: float):
+        super().__init__(f"{budget} budget exhausted, retry in {retry_after:.0f}s")
+        self.budget = budget
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, per_seconds: float, clock=time.monotonic):
+        self.capacity = capacity
+        self.rate = capacity / per_seconds
+        self.clock = clock
+        self.tokens = float(capacity)
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, reserve: float = 0.0, cost: float = 1) -> float:
+        """Seconds until `cost` tokens can be taken while leaving `reserve` of the bucket."""
+        self._refill()
+        # A call costing more than the bucket can ever hold goes once it's
+        # full, and leaves it in debt
+        cost = min(cost, self.capacity * (1 - reserve))
+        needed = cost + reserve * self.capacity - self.tokens
+        return max(0.0, needed / self.rate)
+
+    def take(self, n: float = 1):
+        self._refill()
+        self.tokens -= n
+
+    def drain(self):
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class Budget:
+    """
+    Token buckets and a concurrency limit for one upstream, with a priority
+    queue in front of them. Calls are granted strictly in priority order
+    (first come first served within one), so a queued user request is always
+    next in line ahead of any background work.
+    """
+
+    def __init__(self, name, buckets, concurrency, clock=time.monotonic):
+        self.name = name
+        self.buckets = [TokenBucket(capacity, per_seconds, clock) for capacity, per_seconds in buckets]
+        self.concurrency = concurrency
+
+        self.in_flight = 0
+        self._queue = []  # (priority, seq, future, cost)
+        self._seq = itertools.count()
+        self._timer = None
+
+        self.granted = 0
+        self.shed = 0
+        self.throttled = 0
+
+    def wait_time(self, priority, cost: float = 1) -> float:
+        reserve = RESERVE[priority]
+        return max(bucket.wait_time(reserve, cost) for bucket in self.buckets)
+
+    async def acquire(self, priority, cost: float = 1):
+        max_wait = MAX_WAIT[priority]
+
+        # Shed straight away rather than queue for tokens that won't come in time
+        if max_wait is not None and self.wait_time(priority, cost) > max_wait:
+            self.shed += 1
+            raise UpstreamBusy(self.name, self.wait_time(priority, cost))
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future, cost))
+        self._pump()
+
+        try:
+            await asyncio.wait_for(future, max_wait)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            raise UpstreamBusy(self.name, self.wait_time(priority, cost)) from None
+        except asyncio.CancelledError:
+            # Granted just as we were cancelled: hand the slot back
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._pump()
+
+    def throttle(self):
+        """Upstream said 429: stop spending until the buckets refill."""
+        self.throttled += 1
+        for bucket in self.buckets:
+            bucket.drain()
+
+    def _pump(self):
+        while self._queue and self.in_flight < self.concurrency:
+            priority, _, future, cost = self._queue[0]
+            if future.done() or future.get_loop() is not asyncio.get_running_loop():
+                # Its caller timed out or went away, or its event loop did
+                heapq.heappop(self._queue)
+                continue
+
+            wait = self.wait_time(priority, cost)
+            if wait > 0:
+                self._wake_in(wait)
+                return
+
+            heapq.heappop(self._queue)
+            for bucket in self.buckets:
+                bucket.take(cost)
+            self.in_flight += 1
+            self.granted += 1
+            future.set_result(None)
+
+    def _wake_in(self, seconds):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(seconds, self._pump)
+
+    def stats(self) -> dict:
+        return {
+            "queued": sum(not future.done() for _, _, future, _ in self._queue),
+            "in_flight": self.in_flight,
+            "tokens": [round(bucket.tokens, 1) for bucket in self.buckets],
+            "granted": self.granted,
+            "shed": self.shed,
+            "throttled": self.throttled,
+        }
+
+
+class UpstreamScheduler:
+    """Every upstream call goes through here; hosts without a budget pass straight through."""
+
+    def __init__(self, budgets=BUDGETS, host_budgets=HOST_BUDGETS):
+        self.budgets = {name: Budget(name, **config) for name, config in budgets.items()}
+        self.host_budgets = dict(host_budgets)
+
+    def route(self, url, budget):
+        """Charges calls to `url`'s host to the named budget."""
+        self.host_budgets[urlsplit(url).netloc] = budget
+
+    def budget_for(self, host):
+        name = self.host_budgets.get(host)
+        return self.budgets[name] if name else None
+
+    @asynccontextmanager
+    async def slot(self, host, priority=None, cost: float = 1):
+        """Holds one in-flight slot for a call to `host`, costing `cost` tokens."""
+        budget = self.budget_for(host)
+        if budget is None:
+            yield
+            return
+
+        await budget.acquire(_PRIORITY.get() if priority is None else priority, cost)
+        try:
+            yield
+        finally:
+            budget.release()
+
+    def throttle(self, host):
+        budget = self.budget_for(host)
+        if budget is not None:
+            budget.throttle()
+
+    def stats(self) -> dict:
+        return {name: budget.stats() for name, budget in self.budgets.items()}
+
+
+@contextmanager
+def priority(level):
+    """Runs everything inside (and any task started from it) at `level`."""
+    token = _PRIORITY.set(level)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+SCHEDULER = UpstreamScheduler()
@@ -0,0 +1,165 @@
+import asyncio
+import fcntl
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# ---------------- CONFIG ----------------
+
+COUNTER_PATH = Path(os.environ.get("COUNTER_PATH", Path(__file__).resolve().parent / "counter.csv"))
+
+# Counts live in a small file in shared memory that every worker maps, so
+# all of them add up to the same number. It outlives worker restarts but not
+# the machine; counter.csv is what survives that
+SHARED_DIR = Path("/dev/shm") if Path("/dev/shm").is_dir() else Path(tempfile.gettempdir())
+SHARED_PATH = Path(os.environ.get("COUNTER_SHARED_PATH", SHARED_DIR / "snowday_counter"))
+
+# Most worker processes that can count at once
+SHARDS = 64
+
+# How often counts are written to counter.csv
+FLUSH_SECONDS = 30
+
+# The count starts over every day, and again when school starts
+RESET_HOUR = 7
+
+# ----------------------------------------
+
+# Bump whenever the layout below changes; older files are started over
+_LAYOUT = 1
+
+# int64 slots. Header: layout, base epoch, base value (what counter.csv held
+# at startup). Then one shard per worker: owner pid, epoch, count, padded to
+# 64 bytes so workers never write to the same cache line
+_HEADER = 8
+_SHARD = 8
+_OWNER, _EPOCH, _COUNT = 0, 1, 2
+
+
+def epoch(now: datetime) -> int:
+    """Which counting period `now` falls in: two a day, split at RESET_HOUR."""
+    return now.toordinal() * 2 + (now.hour >= RESET_HOUR)
+
+
+class VisitCounter:
+    """
+    A visit count shared by every worker on the machine.
+
+    Each worker only ever writes its own shard, so counting is a plain
+    in-memory increment with no lock. Reading sums the shards still in the
+    current period. Persisting is a snapshot written from a thread, so it
+    never holds up a request.
+    """
+
+    def __init__(self, path=COUNTER_PATH, shared_path=SHARED_PATH, now=datetime.now):
+        self.path = Path(path)
+        self.shared_path = Path(shared_path)
+        self._now = now
+        self._flushed = None
+
+        self._fd = os.open(self.shared_path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = (_HEADER + SHARDS * _SHARD) * 8
+
+        # Setting up the file and claiming a shard are the only steps that lock
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            fresh = os.fstat(self._fd).st_size != size
+            if fresh:
+                os.ftruncate(self._fd, size)
+
+            self._slots = np.memmap(self.shared_path, dtype=np.int64, mode="r+", shape=(size // 8,))
+            self._shards = self._slots[_HEADER:].reshape(SHARDS, _SHARD)
+
+            if fresh or self._slots[0] != _LAYOUT:
+                self._slots[:] = 0
+                self._slots[0] = _LAYOUT
+                self._slots[1], self._slots[2] = self._read_file()
+
+            self._shard = self._shards[self._claim_shard()]
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _claim_shard(self) -> int:
+        pid = os.getpid()
+        for i, owner in enumerate(self._shards[:, _OWNER]):
+            # A dead worker's shard is taken over count and all
+            if owner in (0, pid) or not _alive(int(owner)):
+                self._shards[i, _OWNER] = pid
+                return i
+
+        raise RuntimeError(f"all {SHARDS} counter shards are taken")
+
+    def _read_file(self):
+        """(epoch, value) from counter.csv, or (0, 0) if there's nothing usable."""
+        try:
+            _, row = self.path.read_text().splitlines()[:2]
+            value, last_date, hour = row.split(",")
+            saved = datetime.strptime(last_date, "%Y-%m-%d").replace(hour=int(hour))
+            return epoch(saved), int(value)
+        except (FileNotFoundError, ValueError):
+            return 0, 0
+
+    def increment(self) -> int:
+        current = epoch(self._now())
+        if self._shard[_EPOCH] != current:
+            # Zero the count before moving to the new period, so the old
+            # count is never summed into the new one
+            self._shard[_COUNT] = 0
+            self._shard[_EPOCH] = current
+
+        self._shard[_COUNT] += 1
+        return self.value(current)
+
+    def value(self, current=None) -> int:
+        current = epoch(self._now()) if current is None else current
+        shards = self._shards[:, _COUNT][self._shards[:, _EPOCH] == current]
+        base = self._slots[2] if self._slots[1] == current else 0
+        return int(base + shards.sum())
+
+    def flush(self) -> bool:
+        """Writes the count to counter.csv if it changed. Returns True if it did."""
+        try:
+            # One worker writes at a time; the others just skip this round
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+
+        try:
+            now = self._now()
+            value = self.value(epoch(now))
+            if (epoch(now), value) == self._flushed:
+                return False
+
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(f"value,last_changed_date,hour\n{value},{now:%Y-%m-%d},{now.hour}\n")
+            os.replace(tmp, self.path)
+
+            self._flushed = (epoch(now), value)
+            return True
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    async def run_flusher(self, interval: float = FLUSH_SECONDS):
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await asyncio.to_thread(self.flush)
+                except Exception as e:
+                    print("Counter flush failed:", repr(e))
+        finally:
+            # Shutting down: keep whatever was counted since the last flush
+            self.flush()
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
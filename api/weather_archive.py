@@ -0,0 +1,149 @@
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+# ---------------- CONFIG ----------------
+
+ARCHIVE_DIR = Path(__file__).resolve().parent / "data" / "archive"
+
+# The archive API trails real time by a few days, so a month is only frozen
+# into the store once it ended at least this long ago
+SETTLE_DAYS = 7
+
+# Coordinates are keyed to ~10 m so float noise can't split a location
+COORD_DECIMALS = 4
+
+# ----------------------------------------
+
+
+class WeatherArchive:
+    """
+    Raw Open-Meteo archive responses on disk, one compressed .npz per
+    location and calendar month, with one array per hourly / daily variable.
+
+    Past weather never changes, so a month that has settled is written once
+    and read forever after. Reads hand back the same {"hourly", "daily"}
+    shape the API returns, so callers can't tell where it came from.
+    """
+
+    def __init__(self, root=ARCHIVE_DIR, today=None):
+        self.root = Path(root)
+        self._today = today
+
+    def today(self) -> date:
+        return self._today or date.today()
+
+    def _path(self, lat, lon, month: date) -> Path:
+        location = f"{round(float(lat), COORD_DECIMALS)}_{round(float(lon), COORD_DECIMALS)}"
+        return self.root / location / f"{month:%Y-%m}.npz"
+
+    def is_settled(self, month: date) -> bool:
+        return month_end(month) <= self.today() - timedelta(days=SETTLE_DAYS)
+
+    def has_month(self, lat, lon, month: date, hourly_vars, daily_vars) -> bool:
+        path = self._path(lat, lon, month)
+        if not path.exists():
+            return False
+
+        # A month stored before a variable was added has to be fetched again
+        with np.load(path) as arrays:
+            keys = set(arrays.files)
+        return all(f"hourly/{v}" in keys for v in hourly_vars) and all(f"daily/{v}" in keys for v in daily_vars)
+
+    def missing_months(self, lat, lon, start: date, end: date, hourly_vars, daily_vars) -> list:
+        return [m for m in months(start, end) if not self.has_month(lat, lon, m, hourly_vars, daily_vars)]
+
+    def read(self, lat, lon, start: date, end: date, hourly_vars, daily_vars) -> dict:
+        """Every stored month between start and end, trimmed to those dates."""
+        hourly = {v: [] for v in ["time"] + list(hourly_vars)}
+        daily = {v: [] for v in ["time"] + list(daily_vars)}
+
+        for month in months(start, end):
+            with np.load(self._path(lat, lon, month)) as arrays:
+                for v in hourly:
+                    hourly[v].append(arrays[f"hourly/{v}"])
+                for v in daily:
+                    daily[v].append(arrays[f"daily/{v}"])
+
+        hourly = {v: np.concatenate(parts) for v, parts in hourly.items()}
+        daily = {v: np.concatenate(parts) for v, parts in daily.items()}
+
+        first, last = np.datetime64(start, "D"), np.datetime64(end, "D")
+        hour_days = hourly["time"].astype("datetime64[D]")
+        hour_mask = (hour_days >= first) & (hour_days <= last)
+        day_mask = (daily["time"] >= first) & (daily["time"] <= last)
+
+        return {
+            "hourly": _to_response(hourly, hour_mask, "m"),
+            "daily": _to_response(daily, day_mask, "D"),
+        }
+
+    def write(self, lat, lon, data: dict) -> int:
+        """
+        Splits a response into months and stores every settled month it fully
+        covers. Returns how many were written.
+        """
+        hourly = _from_response(data["hourly"], "m")
+        daily = _from_response(data["daily"], "D")
+
+        if not len(daily["time"]):
+            return 0
+
+        written = 0
+        first_day = daily["time"][0].astype(date)
+        last_day = daily["time"][-1].astype(date)
+
+        for month in months(first_day, last_day):
+            # Only whole months: a partial one would hide the days it's missing
+            if first_day > month or last_day < month_end(month) or not self.is_settled(month):
+                continue
+
+            lo, hi = np.datetime64(month, "M"), np.datetime64(month, "M") + 1
+            hour_mask = (hourly["time"] >= lo) & (hourly["time"] < hi)
+            day_mask = (daily["time"] >= lo) & (daily["time"] < hi)
+
+            path = self._path(lat, lon, month)
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+            tmp = path.with_name(path.stem + ".tmp.npz")
+            np.savez_compressed(
+                tmp,
+                **{f"hourly/{v}": values[hour_mask] for v, values in hourly.items()},
+                **{f"daily/{v}": values[day_mask] for v, values in daily.items()},
+            )
+            tmp.replace(path)
+            written += 1
+
+        return written
+
+
+def months(start: date, end: date) -> list:
+    """First day of every calendar month touched by start..end."""
+    result = []
+    month = start.replace(day=1)
+    while month <= end:
+        result.append(month)
+        month = (month + timedelta(days=32)).replace(day=1)
+    return result
+
+def month_end(month: date) -> date:
+    return (month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+
+def _from_response(section: dict, unit) -> dict:
+    # Missing values come back as null; NaN keeps every column a plain float array
+    arrays = {"time": np.asarray(section["time"], dtype=f"datetime64[{unit}]")}
+    for v, values in section.items():
+        if v != "time":
+            arrays[v] = np.array([np.nan if x is None else x for x in values], dtype=float)
+    return arrays
+
+def _to_response(arrays: dict, mask, unit) -> dict:
+    # Back to the API's shape: ISO time strings, and None where a value is missing
+    section = {"time": np.datetime_as_string(arrays["time"][mask], unit=unit).tolist()}
+    for v, values in arrays.items():
+        if v != "time":
+            values = values[mask]
+            section[v] = np.where(np.isnan(values), None, values).tolist()
+    return section
@@ -1,17 +1,37 @@
-import requests
-import pandas as pd
+from __future__ import annotations
+
+import asyncio
+import os
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
-from pathlib import Path
+
+import http_client
+from feature_engine import HOURLY_VARIABLES, build_features
+from forecast_cache import ForecastCache, grid_cell, cell_center
+from label_store import DEFAULT_BOARD, LabelStore
+from metrics import stage
+from upstream_scheduler import BACKGROUND, SCHEDULER, priority
+from weather_archive import WeatherArchive, months, month_end
 
 # ---------------- CONFIG ----------------
 
 LATITUDE = 44.569
 LONGITUDE = -80.98
 
-BASE_DIR = Path(__file__).resolve().parent
-CSV_PATH = BASE_DIR / "data" / "snow_day_dates.csv"
-SNOW_DAYS = pd.read_csv(CSV_PATH)
+FORECAST_URL = os.environ.get("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+ARCHIVE_URL = os.environ.get("OPEN_METEO_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/archive")
+
+# Both count against Open-Meteo's limits wherever they point
+SCHEDULER.route(FORECAST_URL, "open-meteo")
+SCHEDULER.route(ARCHIVE_URL, "open-meteo")
+
+# Closure history of every board we know, for the snow_day column
+LABELS = LabelStore.load()
+
+FORECAST_CACHE = ForecastCache()
+WEATHER_ARCHIVE = WeatherArchive()
+
+DAILY_VARIABLES = ["temperature_2m_min", "wind_gusts_10m_max"]
 
 # ----------------------------------------
 
@@ -33,12 +53,22 @@ def safe_sum(values):
 
 from datetime import datetime, timedelta
 
-def fetch_weather(start_date: str, end_date: str, lat: float = LATITUDE, lon: float = LONGITUDE, use_forecast: bool = False) -> dict:
+# Open-Meteo takes comma-separated coordinates; this keeps the URL a sane length
+MAX_LOCATIONS_PER_REQUEST = 100
 
-    if use_forecast:
-        url = "https://api.open-meteo.com/v1/forecast"
-    else:
-        url = "https://archive-api.open-meteo.com/v1/archive"
+# Open-Meteo bills each location in a request as one call, or more when it
+# asks for over 10 variables or over 2 weeks of data
+BILLED_VARIABLES = 10
+BILLED_DAYS = 14
+
+def call_cost(start_date, end_date, locations: int = 1) -> float:
+    """What Open-Meteo counts a request as, in calls against its limits."""
+    days = (datetime.fromisoformat(end_date) - datetime.fromisoformat(start_date)).days + 1
+    variables = len(HOURLY_VARIABLES) + len(DAILY_VARIABLES)
+    return locations * max(1, variables / BILLED_VARIABLES) * max(1, days / BILLED_DAYS)
+
+def _weather_request(start_date, end_date, lat, lon, use_forecast):
+    url = FORECAST_URL if use_forecast else ARCHIVE_URL
 
     params = {
         "latitude": lat,
@@ -47,17 +77,209 @@ def fetch_weather(start_date: str, end_date: str, lat: float = LATITUDE, lon: fl
         "start_date": start_date,
         "end_date": end_date,
 
-        "daily": ["temperature_2m_min", "wind_gusts_10m_max"],
-        "hourly": ["temperature_2m", "dew_point_2m", "precipitation", "snowfall",
-                   "weather_code", "wind_speed_10m", "wind_gusts_10m"],
+        "daily": DAILY_VARIABLES,
+        "hourly": HOURLY_VARIABLES,
 
         "timezone": "America/New_York",
     }
 
-    r = requests.get(url, params=params)
+    return url, params
+
+async def fetch_weather(start_date: str, end_date: str, lat: float = LATITUDE, lon: float = LONGITUDE, use_forecast: bool = False) -> dict:
+    url, params = _weather_request(start_date, end_date, lat, lon, use_forecast)
+
+    r = await http_client.get(url, params=params, cost=call_cost(start_date, end_date))
     return r.json()
 
+async def fetch_weather_many(start_date: str, end_date: str, coords: list, use_forecast: bool = False) -> list:
+    """
+    One upstream call for up to MAX_LOCATIONS_PER_REQUEST (lat, lon) pairs.
+    Returns one response per pair, in order.
+    """
+    url, params = _weather_request(
+        start_date,
+        end_date,
+        ",".join(str(lat) for lat, _ in coords),
+        ",".join(str(lon) for _, lon in coords),
+        use_forecast,
+    )
+
+    r = await http_client.get(url, params=params, cost=call_cost(start_date, end_date, len(coords)))
+    data = r.json()
+
+    # A single location comes back as an object, and so does an error
+    if isinstance(data, dict):
+        return [data] * len(coords)
+    return data
+
+async def fetch_archive(start_date: str, end_date: str, lat: float, lon: float) -> dict:
+    """
+    fetch_weather(use_forecast=False), served from WEATHER_ARCHIVE where it can.
+    Only the spans the archive doesn't have are requested: missing settled
+    months are fetched whole and stored for next time, and recent days that
+    could still change are fetched as-is.
+    """
+    start = datetime.fromisoformat(start_date).date()
+    end = datetime.fromisoformat(end_date).date()
+
+    # Settled months all come before the ones that aren't
+    settled = [month for month in months(start, end) if WEATHER_ARCHIVE.is_settled(month)]
+    stored_end = min(end, month_end(settled[-1])) if settled else None
+
+    if settled:
+        missing = WEATHER_ARCHIVE.missing_months(lat, lon, start, stored_end, HOURLY_VARIABLES, DAILY_VARIABLES)
+
+        # Whole months, one request per run of consecutive missing months
+        for first, last in _month_runs(missing):
+            data = await fetch_weather(
+                first.strftime("%Y-%m-%d"),
+                month_end(last).strftime("%Y-%m-%d"),
+                lat=lat,
+                lon=lon,
+                use_forecast=False,
+            )
+
+            # Error bodies have no data to store; hand them back like fetch_weather would
+            if "hourly" not in data or "daily" not in data:
+                return data
+
+            WEATHER_ARCHIVE.write(lat, lon, data)
+
+        data = WEATHER_ARCHIVE.read(lat, lon, start, stored_end, HOURLY_VARIABLES, DAILY_VARIABLES)
+        if stored_end == end:
+            return data
+
+    recent = await fetch_weather(
+        (stored_end + timedelta(days=1)).strftime("%Y-%m-%d") if settled else start_date,
+        end_date,
+        lat=lat,
+        lon=lon,
+        use_forecast=False,
+    )
+
+    if not settled or "hourly" not in recent or "daily" not in recent:
+        return recent
+
+    return {
+        section: {key: data[section][key] + recent[section][key] for key in data[section]}
+        for section in ("hourly", "daily")
+    }
+
+def archive_has(start_date: str, end_date: str, lat: float, lon: float) -> bool:
+    """True if fetch_archive can answer entirely from disk."""
+    start = datetime.fromisoformat(start_date).date()
+    end = datetime.fromisoformat(end_date).date()
+
+    return all(WEATHER_ARCHIVE.is_settled(month) for month in months(start, end)) and not (
+        WEATHER_ARCHIVE.missing_months(lat, lon, start, end, HOURLY_VARIABLES, DAILY_VARIABLES)
+    )
+
+def _month_runs(month_starts: list) -> list:
+    """(first, last) month of every run of consecutive months."""
+    runs = []
+    for month in month_starts:
+        if runs and months(runs[-1][1], month)[1:] == [month]:
+            runs[-1][1] = month
+        else:
+            runs.append([month, month])
+    return runs
+
+# key -> background refresh task
+_REVALIDATING = {}
+
+async def fetch_forecast(start_date: str, end_date: str, lat: float, lon: float) -> dict:
+    """
+    Cached fetch_weather(use_forecast=True). Every coordinate in the same grid
+    cell shares one entry; stale entries are returned straight away and
+    refreshed in the background so nobody waits on Open-Meteo for them.
+    """
+    key = (grid_cell(lat, lon), start_date, end_date)
+
+    data, fresh = FORECAST_CACHE.get(key)
+    if data is not None:
+        if not fresh:
+            _revalidate_in_background(key)
+        return data
+
+    return await _refresh_forecast(key)
+
+async def _refresh_forecast(key) -> dict:
+    cell, start_date, end_date = key
+    lat, lon = cell_center(cell)
+
+    data = await fetch_weather(start_date, end_date, lat=lat, lon=lon, use_forecast=True)
+
+    # Don't cache upstream errors
+    if "hourly" in data and "daily" in data:
+        FORECAST_CACHE.put(key, data)
+
+    return data
+
+async def fetch_forecasts(start_date: str, end_date: str, coords: list, use_cache: bool = True) -> list:
+    """
+    Cached fetch_forecast for many locations. Uncached grid cells are fetched
+    together, MAX_LOCATIONS_PER_REQUEST per upstream call. Bulk jobs pass
+    use_cache=False so they don't evict what users are asking for.
+    """
+    keys = [(grid_cell(lat, lon), start_date, end_date) for lat, lon in coords]
+
+    results = {}
+    missing = []
+    for key in dict.fromkeys(keys):
+        if not use_cache:
+            missing.append(key)
+            continue
+
+        data, fresh = FORECAST_CACHE.get(key)
+        if data is None:
+            missing.append(key)
+            continue
+
+        results[key] = data
+        if not fresh:
+            _revalidate_in_background(key)
+
+    chunks = [
+        missing[i:i + MAX_LOCATIONS_PER_REQUEST]
+        for i in range(0, len(missing), MAX_LOCATIONS_PER_REQUEST)
+    ]
+    responses = await asyncio.gather(*(_refresh_forecasts(chunk, use_cache) for chunk in chunks))
+
+    for chunk, datas in zip(chunks, responses):
+        results.update(zip(chunk, datas))
+
+    return [results[key] for key in keys]
+
+async def _refresh_forecasts(keys, use_cache: bool = True) -> list:
+    _, start_date, end_date = keys[0]
+    centers = [cell_center(cell) for cell, _, _ in keys]
+
+    datas = await fetch_weather_many(start_date, end_date, centers, use_forecast=True)
+
+    for key, data in zip(keys, datas):
+        if use_cache and "hourly" in data and "daily" in data:
+            FORECAST_CACHE.put(key, data)
+
+    return datas
+
+def _revalidate_in_background(key):
+    if key in _REVALIDATING:
+        return
+
+    async def run():
+        try:
+            # Whoever asked was already served the stale entry
+            with priority(BACKGROUND):
+                await _refresh_forecast(key)
+        except Exception as e:
+            print("Forecast revalidation failed:", key, e)
+        finally:
+            _REVALIDATING.pop(key, None)
+
+    _REVALIDATING[key] = asyncio.create_task(run())
+
 def get_hourly_for_date(hourly, target_date):
+    import pandas as pd
 
     hourly_times = pd.to_datetime(hourly["time"]).strftime("%Y-%m-%d")
 
@@ -73,6 +295,7 @@ def get_hourly_for_date(hourly, target_date):
     }
 
 def get_daily_for_date(daily, target_date):
+    import pandas as pd
 
     daily_times = pd.to_datetime(daily["time"]).strftime("%Y-%m-%d")
 
@@ -87,17 +310,15 @@ def get_daily_for_date(daily, target_date):
     # creating a dictionary
     return {key: daily[key][day_index] for key in daily.keys()}
 
-def get_data_within_timerange(
+async def get_data_within_timerange(
     start_date: str,
     end_date: str,
     lat: float,
     lon: float,
     use_forecast: bool = False,
+    board: str = DEFAULT_BOARD,
 ) -> pd.DataFrame:
 
-    print("REQUESTING:", start_date, "→", end_date)
-    rows = []
-
     # Convert to datetime
     start_dt = datetime.fromisoformat(start_date)
     end_dt = datetime.fromisoformat(end_date)
@@ -109,17 +330,41 @@ def get_data_within_timerange(
             end_dt = yesterday
 
     # Fetch weather only for the valid range
-    data = fetch_weather(
-        start_dt.strftime("%Y-%m-%d"),
-        end_dt.strftime("%Y-%m-%d"),
-        lat=lat,
-        lon=lon,
-        use_forecast=use_forecast,
-    )
+    if use_forecast:
+        data = await fetch_forecast(
+            start_dt.strftime("%Y-%m-%d"),
+            end_dt.strftime("%Y-%m-%d"),
+            lat=lat,
+            lon=lon,
+        )
+    else:
+        data = await fetch_archive(
+            start_dt.strftime("%Y-%m-%d"),
+            end_dt.strftime("%Y-%m-%d"),
+            lat=lat,
+            lon=lon,
+        )
 
+    return features_from_response(data, start_dt, end_dt, board)
+
+def features_from_response(data: dict, start_dt: datetime, end_dt: datetime, board: str = DEFAULT_BOARD) -> pd.DataFrame:
     hourly = data["hourly"]
     daily = data["daily"]
 
+    with stage("features"):
+        df = build_features(hourly, daily, start_dt, end_dt, LABELS.closures(board))
+        if df is not None:
+            return df
+
+        # Responses that don't line up into whole 24-hour days take the per-day path
+        return build_rows_by_day(hourly, daily, start_dt, end_dt, board)
+
+def build_rows_by_day(hourly, daily, start_dt: datetime, end_dt: datetime, board: str = DEFAULT_BOARD) -> pd.DataFrame:
+    """Reference feature builder: walks the range one day at a time."""
+    import pandas as pd
+
+    rows = []
+
     current = start_dt
     end = end_dt
 
@@ -158,7 +403,7 @@ def get_data_within_timerange(
 
         row = {
             "date": date_str,
-            "snow_day": int((SNOW_DAYS["date"].astype(str) == date_str).any()),
+            "snow_day": int(LABELS.is_closed(board, date_str)),
 
             "snowfall_last_24h": (safe_sum(yesterday_snow[7:]) + snowfall_overnight) if yesterday_snow else 0,
             "snowfall_last_12h": (safe_sum(yesterday_snow[20:]) + snowfall_overnight) if yesterday_snow else 0,
@@ -220,13 +465,13 @@ def get_weather_code_label(code) -> str:
     return codes.get(code, "Other")
 
 
-def t() -> pd.DataFrame:
+async def t() -> pd.DataFrame:
     today = datetime.today()
     monday = today - timedelta(days=today.weekday())
     friday = monday + timedelta(days=4)
 
     print(monday.day)
-    return get_data_within_timerange(
+    return await get_data_within_timerange(
         monday.strftime("%Y-%m-%d"),
         friday.strftime("%Y-%m-%d"),
         lat=LATITUDE,
@@ -234,10 +479,8 @@ def t() -> pd.DataFrame:
         use_forecast=True
     )
 
-def get_this_weeks_data(lat: float = 0, lon: float = 0) -> pd.DataFrame:
-    if lat == 0 and lon == 0:
-        lat, lon = LATITUDE, LONGITUDE
-
+def this_weeks_dates() -> list:
+    """The next 5 school days, starting today if school hasn't started yet."""
     tz = ZoneInfo("America/Toronto")
     now = datetime.now(tz)
     today = now.date()
@@ -252,7 +495,15 @@ def get_this_weeks_data(lat: float = 0, lon: float = 0) -> pd.DataFrame:
             dates.append(current.isoformat())
         current += timedelta(days=1)
 
-    df = get_data_within_timerange(
+    return dates
+
+async def get_this_weeks_data(lat: float = 0, lon: float = 0) -> pd.DataFrame:
+    if lat == 0 and lon == 0:
+        lat, lon = LATITUDE, LONGITUDE
+
+    dates = this_weeks_dates()
+
+    df = await get_data_within_timerange(
         dates[0],
         dates[-1],
         lat,
@@ -263,13 +514,36 @@ def get_this_weeks_data(lat: float = 0, lon: float = 0) -> pd.DataFrame:
     df = df[df["date"].isin(dates)]
     return df.reset_index(drop=True)
 
+async def get_this_weeks_data_many(coords: list, dates: list = None, use_cache: bool = True) -> list:
+    """
+    get_this_weeks_data for many (lat, lon) pairs with as few upstream calls as
+    possible. Locations whose forecast couldn't be fetched come back as None.
+    """
+    dates = dates or this_weeks_dates()
+    start_dt = datetime.fromisoformat(dates[0])
+    end_dt = datetime.fromisoformat(dates[-1])
+
+    datas = await fetch_forecasts(dates[0], dates[-1], coords, use_cache=use_cache)
+
+    frames = []
+    for data in datas:
+        if "hourly" not in data or "daily" not in data:
+            frames.append(None)
+            continue
+
+        df = features_from_response(data, start_dt, end_dt)
+        df = df[df["date"].isin(dates)]
+        frames.append(df.reset_index(drop=True))
+
+    return frames
+
 def save_to_file(data: pd.DataFrame, filename: str):
     """Save DataFrame to CSV."""
     data.to_csv(filename, index=False)
     print(f"Saved {len(data)} rows to {filename}")
 
-#data = get_data_within_timerange("2024-11-01", "2025-04-30")
+#data = asyncio.run(get_data_within_timerange("2024-11-01", "2025-04-30"))
 #save_to_file(data, "../data/training_dataset_1.csv")
 
-#data = t()
+#data = asyncio.run(t())
 #save_to_file(data, f"this week.csv")
\ No newline at end of file
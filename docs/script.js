@@ -1,7 +1,5 @@
-const predictApi = "https://snowday-ai-predictor.fly.dev/predict";
+const forecastApi = "https://snowday-ai-predictor.fly.dev/forecast";
 const counterApi = "https://snowday-ai-predictor.fly.dev/count";
-const explainerApi = "https://snowday-ai-predictor.fly.dev/explain";
-const alertApi = "https://snowday-ai-predictor.fly.dev/alert";
 const locationApi = "https://geocoding-api.open-meteo.com/v1/search?";
 
 /* -------------------------
@@ -344,7 +342,7 @@ function lastsUntilTomorrow() {
     return false;
   }
 
-  if (!alertData.expires) return false;
+  if (!alertData || !alertData.expires) return false;
 
   const tz = alertData.timezone || "America/Toronto";
   const expiresDate = new Date(alertData.expires);
@@ -428,21 +426,30 @@ if (cachedLocationData) {
   const lat = loc.latitude;
   const lon = loc.longitude;
 
-  fetch(predictApi + `?lat=${lat}&lon=${lon}`)
-    .then(r => r.json())
+  // Predictions, explanations and the alert all come from one request
+  fetch(forecastApi + `?lat=${lat}&lon=${lon}`)
+    .then(r => (r.ok ? r.json() : null))
     .then(data => {
-      localStorage.setItem("snowday_predictions", JSON.stringify(data));
-      pendingData.predictions = data;
+      // A 503/504 keeps whatever is cached rather than caching the error
+      if (!data) return;
+
+      // No alert comes back as null; don't cache it as the string "null"
+      if (data.alert != null) {
+        localStorage.setItem("alert_data", JSON.stringify(data.alert));
+        cachedAlert = localStorage.getItem("alert_data");
+      } else {
+        localStorage.removeItem("alert_data");
+        cachedAlert = null;
+      }
+
+      localStorage.setItem("snowday_predictions", JSON.stringify(data.predictions));
+      pendingData.predictions = data.predictions;
       loadingState.predictions = true;
-      checkLoadingComplete();
-    });
 
-  fetch(explainerApi + `?lat=${lat}&lon=${lon}`)
-    .then(r => r.json())
-    .then(data => {
-      localStorage.setItem("prediction_explanations", JSON.stringify(data));
-      pendingData.explanations = data;
+      localStorage.setItem("prediction_explanations", JSON.stringify(data.explanations));
+      pendingData.explanations = data.explanations;
       loadingState.explanations = true;
+
       checkLoadingComplete();
     });
 
@@ -455,18 +462,6 @@ if (cachedLocationData) {
       loadingState.counter = true;
       checkLoadingComplete();
     });
-
-  fetch(alertApi + `?lat=${lat}&lon=${lon}`)
-    .then(r => r.json())
-    .then(data => {
-      localStorage.setItem("alert_data", JSON.stringify(data));
-      
-      cachedAlert = localStorage.getItem("alert_data");
-      hydrateUI(); // Immediate update since alert can be fetched faster than main data and is more important to show ASAP
-    })
-    .catch(() => {
-      // Alert data is optional and should not block UI
-    });
 }
 
 /* -------------------------